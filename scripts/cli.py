@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+# Single entry point for the pipeline stages. Only the requested stage is
+# imported (the others, and their pandas / pyarrow / model imports, never
+# are), so --help answers at once. The stage runs in this process with its own
+# command line, exactly as when its script is started directly:
+#   python scripts/cli.py infer deepface --data ... --out ...
+#   python scripts/cli.py evaluate --help
+# Stages separated by a standalone "+" run one after the other in the same
+# interpreter, which pays startup and shared imports once:
+#   python scripts/cli.py normalize --model deepface ... + evaluate --gt ...
+
+import argparse
+import importlib
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+SEPARATOR = "+"
+
+# stage -> (directory, module, description)
+STAGES = {
+    "infer deepface": ("inference", "infer_deepface", "DeepFace inference on an image directory"),
+    "infer facellm": ("inference", "infer_facellm", "FaceLLM inference on an image directory"),
+    "adaptive-sampling": ("evaluation", "adaptive_sampling", "Stratified inference rounds with early stopping"),
+    "manifest": ("inference", "manifest", "Build or refresh a dataset manifest"),
+    "image-store": ("inference", "image_store", "Decode a dataset once into a memory-mapped image store"),
+    "merge-shards": ("inference", "merge_shards", "Merge sharded inference outputs"),
+    "normalize": ("preprocessing", "normalize_stream", "Normalize raw inference outputs to Parquet"),
+    "harmonize-gt": ("preprocessing", "gt_FairFace_harmonized", "Restrict the ground truth to the inferred images"),
+    "evaluate": ("evaluation", "evaluate", "Metrics for every model x task"),
+}
+
+
+def split_stages(argv):
+    # ["a", "-x", "+", "b"] -> [["a", "-x"], ["b"]]
+    stages = [[]]
+    for arg in argv:
+        if arg == SEPARATOR:
+            stages.append([])
+        else:
+            stages[-1].append(arg)
+    return stages
+
+
+def stage_name(args):
+    # Leading words of a stage command line that name the stage, and its arguments
+    if args and args[0] == "infer":
+        return " ".join(args[:2]), args[2:]
+    return (args[0] if args else ""), args[1:]
+
+
+def run_stage(name, args):
+    directory, module_name, _ = STAGES[name]
+    # Stage modules import their siblings flat, as when started from their directory
+    path = str(SCRIPTS_DIR / directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    module = importlib.import_module(module_name)
+
+    argv = sys.argv
+    sys.argv = [f"cli.py {name}", *args]
+    try:
+        module.main()
+    except SystemExit as e:
+        # --help and argument errors exit; a chain stops at the first failure
+        if e.code not in (None, 0) or "-h" in args or "--help" in args:
+            raise
+    finally:
+        sys.argv = argv
+
+
+def parse_args():
+    width = max(len(name) for name in STAGES) + 2
+    stages = "\n".join(f"  {name:<{width}}{description}" for name, (_, _, description) in STAGES.items())
+    parser = argparse.ArgumentParser(
+        "cli.py",
+        description="FaceLLM / DeepFace FairFace pipeline",
+        epilog=f"stages:\n{stages}\n\n"
+               f"Run 'cli.py <stage> --help' for the options of a stage. "
+               f"Stages separated by '{SEPARATOR}' run in order in the same process.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("stage", type=str,
+                        help="Stage to run (see below)")
+    parser.add_argument("args", nargs=argparse.REMAINDER,
+                        help="Arguments of the stage")
+
+    args = parser.parse_args()
+    chain = []
+    for stage in split_stages([args.stage, *args.args]):
+        name, stage_args = stage_name(stage)
+        if name not in STAGES:
+            parser.error(f"unknown stage '{name}' (choose from {', '.join(STAGES)})")
+        chain.append((name, stage_args))
+    return chain
+
+
+def main():
+    chain = parse_args()
+    for name, args in chain:
+        if len(chain) > 1:
+            print(f"[INFO] Stage: {name}")
+        run_stage(name, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# Embedded SQLite store for ground truth, normalized predictions and run metadata.
+# Every table is keyed by image_id (predictions by run_id + image_id, with a
+# secondary index on image_id), so one image's predictions or a GT x run join
+# are indexed lookups instead of re-reading and re-merging whole CSVs.
+# Labels are stored harmonized to the evaluation taxonomy.
+
+import json
+import sqlite3
+import time
+
+import pandas as pd
+
+from common.taxonomy import TASKS, harmonize
+
+PREDICTION_COLUMNS = [
+    "gender", "race", "age", "age_years",
+    "gender_confidence", "race_confidence", "age_confidence", "face_confidence",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    created REAL NOT NULL,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS ground_truth (
+    image_id INTEGER PRIMARY KEY,
+    gender TEXT,
+    race TEXT,
+    age TEXT
+);
+CREATE TABLE IF NOT EXISTS predictions (
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    image_id INTEGER NOT NULL,
+    gender TEXT,
+    race TEXT,
+    age TEXT,
+    age_years INTEGER,
+    gender_confidence REAL,
+    race_confidence REAL,
+    age_confidence REAL,
+    face_confidence REAL,
+    PRIMARY KEY (run_id, image_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS predictions_image_id ON predictions(image_id);
+"""
+
+
+def _nullable(values):
+    # NaN / pd.NA -> None so sqlite stores NULL
+    return [None if pd.isna(v) else v for v in values]
+
+
+class PredictionStore:
+
+    def __init__(self, path, wal=None):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        # WAL needs shared memory between processes, which network filesystems
+        # (results/ on the cluster) do not provide: only for stores on a local
+        # disk. New stores use the rollback journal; wal=None keeps the store's mode.
+        if wal:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        elif wal is not None and self.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Writing
+
+    def put_ground_truth(self, gt):
+        # gt: DataFrame with image_id, gender, race, age (any known label spelling)
+        rows = zip(
+            gt["image_id"].astype(int).tolist(),
+            *(harmonize(gt[task], task).tolist() for task in TASKS),
+        )
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO ground_truth (image_id, gender, race, age) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def put_predictions(self, pred, model, run_id=None, metadata=None):
+        # pred: normalized predictions (image_id + any of PREDICTION_COLUMNS).
+        # Re-using a run_id replaces that run's rows for the same images.
+        run_id = run_id or f"{model.lower()}-{time.strftime('%Y%m%d-%H%M%S')}"
+        metadata = {"n": len(pred), **(metadata or {})}
+
+        columns = {"image_id": pred["image_id"].astype(int).tolist()}
+        for column in PREDICTION_COLUMNS:
+            if column not in pred:
+                columns[column] = [None] * len(pred)
+            elif column in TASKS:
+                columns[column] = harmonize(pred[column], column).tolist()
+            else:
+                columns[column] = _nullable(pred[column].tolist())
+
+        names = ["image_id"] + PREDICTION_COLUMNS
+        placeholders = ", ".join("?" * (len(names) + 1))
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO runs (run_id, model, created, metadata) VALUES (?, ?, ?, ?)",
+                (run_id, model, time.time(), json.dumps(metadata, default=str)),
+            )
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO predictions (run_id, {', '.join(names)}) VALUES ({placeholders})",
+                ((run_id, *row) for row in zip(*(columns[name] for name in names))),
+            )
+        return run_id
+
+    # Reading
+
+    def runs(self):
+        return pd.read_sql_query(
+            "SELECT r.run_id, r.model, r.created, r.metadata, COUNT(p.image_id) AS n "
+            "FROM runs r LEFT JOIN predictions p USING (run_id) "
+            "GROUP BY r.run_id ORDER BY r.created",
+            self.conn,
+        )
+
+    def latest_runs(self):
+        # {model: most recent run_id}
+        rows = self.conn.execute("SELECT model, run_id FROM runs ORDER BY created").fetchall()
+        return dict(rows)
+
+    def run_model(self, run_id):
+        row = self.conn.execute("SELECT model FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown run '{run_id}'")
+        return row[0]
+
+    def eval_frame(self, run_id):
+        # GT joined with one run, in the layout of metrics.load_eval_frames
+        # (image_id, <task>_gt, <task>_pred, confidences)
+        pred_columns = ", ".join(
+            f"p.{c} AS {c}_pred" if c in TASKS else f"p.{c}" for c in PREDICTION_COLUMNS
+        )
+        return pd.read_sql_query(
+            f"SELECT g.image_id, g.gender AS gender_gt, g.race AS race_gt, g.age AS age_gt, {pred_columns} "
+            "FROM predictions p JOIN ground_truth g USING (image_id) "
+            "WHERE p.run_id = ? ORDER BY g.image_id",
+            self.conn, params=(run_id,),
+        )
+
+    def image(self, image_id):
+        # Every run's predictions for one image, with its GT
+        return pd.read_sql_query(
+            "SELECT r.model, p.*, g.gender AS gender_gt, g.race AS race_gt, g.age AS age_gt "
+            "FROM predictions p JOIN runs r USING (run_id) "
+            "LEFT JOIN ground_truth g USING (image_id) "
+            "WHERE p.image_id = ? ORDER BY r.created",
+            self.conn, params=(int(image_id),),
+        )
+
+    def compare(self, run_ids, image_ids=None, limit=None):
+        # One row per image predicted by every run: GT + one column block per run,
+        # the first `limit` images only when given (stops the join early)
+        if not run_ids:
+            raise ValueError("compare needs at least one run")
+
+        select = ["g.image_id", "g.gender AS gender_gt", "g.race AS race_gt", "g.age AS age_gt"]
+        joins, params = [], []
+        for i, run_id in enumerate(run_ids):
+            select += [f"p{i}.{c} AS \"{c}_{run_id}\"" for c in PREDICTION_COLUMNS]
+            joins.append(f"JOIN predictions p{i} ON p{i}.image_id = g.image_id AND p{i}.run_id = ?")
+            params.append(run_id)
+
+        where = ""
+        if image_ids is not None:
+            image_ids = [int(i) for i in image_ids]
+            where = f"WHERE g.image_id IN ({', '.join('?' * len(image_ids))})"
+            params += image_ids
+
+        limit_clause = ""
+        if limit is not None:
+            limit_clause = "LIMIT ?"
+            params.append(int(limit))
+
+        return pd.read_sql_query(
+            f"SELECT {', '.join(select)} FROM ground_truth g {' '.join(joins)} {where} "
+            f"ORDER BY g.image_id {limit_clause}",
+            self.conn, params=params,
+        )
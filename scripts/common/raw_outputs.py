@@ -0,0 +1,23 @@
+# Helpers for the raw inference outputs (JSONL records), shared by the
+# inference wrappers, the normalization scripts and the live evaluation.
+
+import json
+import os
+
+
+def image_id_from_path(image_path):
+    # FairFace image id = file name stem ("train/123.jpg" -> 123)
+    return int(os.path.splitext(os.path.basename(image_path))[0])
+
+
+def strip_markdown(raw):
+    # FaceLLM sometimes wraps its JSON answer in a ```json fence
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.replace("```json", "").replace("```", "").strip()
+    return raw
+
+
+def parse_facellm_json(raw):
+    # FaceLLM answer -> dict; raises ValueError when it is not JSON
+    return json.loads(strip_markdown(raw))
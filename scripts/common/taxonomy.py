@@ -0,0 +1,99 @@
+# FairFace evaluation taxonomy (see taxonomy_fairface.md), shared by every stage.
+# Labels are mapped to integer codes in the order below; anything that cannot
+# be mapped gets the code len(labels) ("unknown", counted as incorrect).
+# Mapping works on whole arrays: each distinct spelling is looked up once in a
+# precompiled code map, numeric ages go through np.digitize.
+
+import numpy as np
+
+GENDER_LABELS = ["Female", "Male"]
+RACE_LABELS = ["Asian", "Black", "Indian", "Latino_Hispanic", "Middle Eastern", "White"]
+AGE_BINS = ["0-2", "3-9", "10-19", "20-29", "30-39", "40-49", "50-59", "60-69", "70+"]
+UNKNOWN = "unknown"
+
+TASK_LABELS = {
+    "gender": GENDER_LABELS,
+    "race": RACE_LABELS,
+    "age": AGE_BINS,
+}
+TASKS = list(TASK_LABELS)
+
+# Lower bound of every age bin after the first one, for np.digitize
+AGE_BIN_EDGES = np.array([3, 10, 20, 30, 40, 50, 60, 70])
+
+# Every known spelling (case-insensitive, "_" read as a space) -> canonical label.
+# Covers FairFace GT, DeepFace outputs (Man/Woman, "latino hispanic") and FaceLLM answers.
+ALIASES = {
+    "gender": {
+        "female": "Female",
+        "woman": "Female",
+        "male": "Male",
+        "man": "Male",
+    },
+    "race": {
+        "asian": "Asian",
+        "east asian": "Asian",
+        "southeast asian": "Asian",
+        "black": "Black",
+        "indian": "Indian",
+        "latino hispanic": "Latino_Hispanic",
+        "latino": "Latino_Hispanic",
+        "hispanic": "Latino_Hispanic",
+        "middle eastern": "Middle Eastern",
+        "white": "White",
+    },
+    "age": {
+        **{label: label for label in AGE_BINS},
+        "70 +": "70+",
+        "more than 70": "70+",
+    },
+}
+
+
+def _canonical_key(value):
+    return " ".join(str(value).lower().replace("_", " ").split())
+
+
+# Precompiled code maps: canonical key -> integer code
+CODE_MAPS = {
+    task: {_canonical_key(key): TASK_LABELS[task].index(label) for key, label in aliases.items()}
+    for task, aliases in ALIASES.items()
+}
+
+
+def encode(values, task):
+    # Array of labels (any known spelling) -> int64 codes, len(labels) for unknown
+    code_map = CODE_MAPS[task]
+    unknown = len(TASK_LABELS[task])
+
+    import pandas as pd  # not at module level: keeps pandas-free stages fast to start
+
+    uniques_codes, uniques = pd.factorize(np.asarray(values, dtype=object).ravel())
+    lookup = np.array(
+        [code_map.get(_canonical_key(v), unknown) for v in uniques] + [unknown], dtype=np.int64
+    )
+    # factorize marks missing values with -1, which indexes the trailing "unknown"
+    return lookup[uniques_codes]
+
+
+def encode_ages(ages):
+    # Numeric ages (years) -> age bin codes
+    return np.digitize(np.asarray(ages, dtype=np.float64), AGE_BIN_EDGES).astype(np.int64)
+
+
+def decode(codes, task):
+    # Integer codes -> labels, with UNKNOWN for out-of-taxonomy codes
+    labels = np.array(TASK_LABELS[task] + [UNKNOWN], dtype=object)
+    return labels[np.asarray(codes)]
+
+
+def harmonize(values, task):
+    # Labels in any known spelling -> canonical labels
+    return decode(encode(values, task), task)
+
+
+def categorical(codes, task):
+    # pandas Categorical with the full, ordered taxonomy as categories
+    import pandas as pd
+
+    return pd.Categorical.from_codes(np.asarray(codes), categories=TASK_LABELS[task] + [UNKNOWN])
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+
+# Adaptive stratified sampling: runs inference round by round on images drawn
+# from the GT race x gender x age cells, and stops as soon as the accuracy of
+# every model x task is known to the requested precision in every cell,
+# instead of running the whole dataset.
+# Each round, images go to the cells whose Wilson interval (projected with the
+# images already given to them this round) is still the widest, so the first
+# rounds are a balanced stratified sample and later ones only feed the cells
+# that are not precise enough yet. Within a cell, images follow a fixed random
+# order (--seed). A cell is done when every interval is at most
+# --target_width wide with at least --min_per_cell results, or when it has no
+# images left. Metrics are read back from the inference outputs, so a stopped
+# schedule resumes where it was.
+#
+# Files in --out_dir:
+#   <model>.jsonl  raw outputs of infer_<model>.py, appended round after round
+#   schedule.txt   images of the completed rounds, in order
+#   round.txt      images of the current round (--image_list of the inference)
+#   cells.json     per-cell counts, accuracies and intervals, rewritten every round
+
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import time
+from pathlib import Path
+from statistics import NormalDist
+
+import numpy as np
+
+from metrics import TASK_LABELS
+from subgroups import GROUP_DIMS
+from watch_inference import GTIndex, RunningMetrics, Tail, write_snapshot
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+INFERENCE_DIR = Path(__file__).resolve().parents[1] / "inference"
+sys.path.append(str(INFERENCE_DIR))
+from common.raw_outputs import image_id_from_path  # noqa: E402
+from jsonl_io import completed_images  # noqa: E402
+from manifest import list_images, read_image_list  # noqa: E402
+
+# --models name -> (name in the metrics, inference script)
+MODELS = {"deepface": ("DeepFace", "infer_deepface.py"), "facellm": ("FaceLLM", "infer_facellm.py")}
+CELL_SHAPE = tuple(len(TASK_LABELS[dim]) for dim in GROUP_DIMS)
+N_CELLS = int(np.prod(CELL_SHAPE))
+
+
+def cell_index(gt):
+    # GT cell of every image_id (-1: no GT or outside the taxonomy), numbered
+    # like subgroups.finest_cells
+    cells = np.zeros(len(gt.codes["age"]), dtype=np.int64)
+    valid = np.ones(len(cells), dtype=bool)
+    for dim in GROUP_DIMS:
+        codes = gt.codes[dim]
+        valid &= (codes >= 0) & (codes < len(TASK_LABELS[dim]))
+        cells = cells * len(TASK_LABELS[dim]) + codes
+    cells[~valid] = -1
+    return cells
+
+
+def cell_labels(cell):
+    index = np.unravel_index(cell, CELL_SHAPE)
+    return {dim: TASK_LABELS[dim][i] for dim, i in zip(GROUP_DIMS, index)}
+
+
+def wilson_interval(correct, n, z):
+    # Wilson score interval of a proportion, (0, 1) where n == 0
+    correct = np.asarray(correct, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = correct / n
+        denom = 1 + z ** 2 / n
+        center = (p + z ** 2 / (2 * n)) / denom
+        half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    return np.where(n > 0, center - half, 0.0), np.where(n > 0, center + half, 1.0)
+
+
+class CellMetrics(RunningMetrics):
+    # Running per-cell accuracy of one model on the images it has answered
+
+    def __init__(self, model, n_ids, cells):
+        self.cells = cells
+        super().__init__(model, n_ids)
+
+    def reset(self, n_ids):
+        super().reset(n_ids)
+        self.correct = {task: np.zeros(N_CELLS, dtype=np.int64) for task in TASK_LABELS}
+        self.total = {task: np.zeros(N_CELLS, dtype=np.int64) for task in TASK_LABELS}
+
+    def update(self, lines, gt):
+        ids, codes = self.decode(lines, gt)
+        cells = self.cells[ids]
+        for task, labels in TASK_LABELS.items():
+            y_true, y_pred = codes[task]
+            keep = (cells >= 0) & (y_true < len(labels))
+            self.total[task] += np.bincount(cells[keep], minlength=N_CELLS)
+            self.correct[task] += np.bincount(cells[keep][y_true[keep] == y_pred[keep]], minlength=N_CELLS)
+
+
+def interval_widths(metrics, tasks, z, extra=0):
+    # Per cell: widest interval and smallest count over models x tasks, as if
+    # `extra` more images per cell were answered at the accuracy observed so far
+    widths, counts = [], []
+    for running in metrics.values():
+        for task in tasks:
+            n = running.total[task]
+            p = np.where(n > 0, running.correct[task] / np.maximum(n, 1), 0.5)
+            low, high = wilson_interval(p * (n + extra), n + extra, z)
+            widths.append(high - low)
+            counts.append(n + extra)
+    return np.max(widths, axis=0), np.min(counts, axis=0)
+
+
+class StratifiedScheduler:
+    # Images of every cell in a fixed random order, minus those already scheduled
+
+    def __init__(self, paths_by_cell, seed=0, scheduled=()):
+        rng = np.random.default_rng(seed)
+        scheduled = set(scheduled)
+        self.available = np.zeros(N_CELLS, dtype=np.int64)
+        self.queues = {}
+        for cell in sorted(paths_by_cell):
+            paths = sorted(paths_by_cell[cell])
+            self.available[cell] = len(paths)
+            order = [paths[i] for i in rng.permutation(len(paths))]
+            self.queues[cell] = [p for p in order if p not in scheduled][::-1]  # popped from the end
+
+    def remaining(self):
+        counts = np.zeros(N_CELLS, dtype=np.int64)
+        for cell, queue in self.queues.items():
+            counts[cell] = len(queue)
+        return counts
+
+    def next_round(self, size, metrics, tasks, z, target_width, min_per_cell):
+        # Gives the next image to the open cell with the widest projected
+        # interval, until `size` images or no cell needs more
+        extra = np.zeros(N_CELLS, dtype=np.int64)
+        remaining = self.remaining()
+        for _ in range(size):
+            width, n = interval_widths(metrics, tasks, z, extra)
+            wanted = ((width > target_width) | (n < min_per_cell)) & (extra < remaining)
+            if not wanted.any():
+                break
+            extra[np.argmax(np.where(wanted, width, -1.0))] += 1
+
+        return [self.queues[cell].pop() for cell in np.flatnonzero(extra) for _ in range(extra[cell])]
+
+
+def cell_report(metrics, tasks, z, scheduler, target_width, min_per_cell):
+    width, n = interval_widths(metrics, tasks, z)
+    done = (width <= target_width) & (n >= min_per_cell)
+    remaining = scheduler.remaining()
+
+    cells = []
+    for cell in np.flatnonzero(scheduler.available):
+        status = "done" if done[cell] else "exhausted" if remaining[cell] == 0 else "open"
+        entry = {**cell_labels(cell), "available": int(scheduler.available[cell]),
+                 "remaining": int(remaining[cell]), "status": status, "width": float(width[cell])}
+        for model, running in metrics.items():
+            entry[model] = {}
+            for task in tasks:
+                total, correct = running.total[task][cell], running.correct[task][cell]
+                low, high = wilson_interval(correct, total, z)
+                entry[model][task] = {"n": int(total),
+                                      "accuracy": float(correct / total) if total else None,
+                                      "ci_low": float(low), "ci_high": float(high)}
+        cells.append(entry)
+    return cells
+
+
+def run_inference(model, data_dir, out_path, image_list, extra_args):
+    script = INFERENCE_DIR / MODELS[model][1]
+    cmd = [sys.executable, str(script), "--data", data_dir, "--out", out_path,
+           "--image_list", image_list, "--resume", *extra_args]
+    returncode = subprocess.run(cmd).returncode
+    if returncode:
+        raise SystemExit(f"{script.name} exited with code {returncode}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Adaptive stratified inference with early stopping")
+
+    parser.add_argument("--gt", type=str, required=True,
+                        help="GT labels (FairFace train_labels.csv or a harmonized copy)")
+    parser.add_argument("--data", type=str, required=True,
+                        help="Image directory (one FairFace split: image ids must be unique)")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Read the image list from this manifest (see manifest.py)")
+    parser.add_argument("--out_dir", type=str, required=True,
+                        help="Outputs, schedule and cell report")
+    parser.add_argument("--models", type=str, nargs="+", default=["deepface", "facellm"], choices=list(MODELS),
+                        help="Models run every round; a cell is done when it is done for all of them")
+    parser.add_argument("--deepface_args", type=str, default="",
+                        help="Extra arguments of infer_deepface.py (e.g. \"--skip_detection --batch_size 32\")")
+    parser.add_argument("--facellm_args", type=str, default="",
+                        help="Extra arguments of infer_facellm.py (at least \"--prompt_file prompt.md\")")
+
+    parser.add_argument("--tasks", type=str, nargs="+", default=list(TASK_LABELS), choices=list(TASK_LABELS),
+                        help="Tasks whose per-cell accuracy must reach the target")
+    parser.add_argument("--target_width", type=float, default=0.2,
+                        help="Largest accepted interval width (upper - lower bound) in every cell")
+    parser.add_argument("--alpha", type=float, default=0.05,
+                        help="Intervals cover 1 - alpha")
+    parser.add_argument("--min_per_cell", type=int, default=30,
+                        help="Results needed in a cell before its interval is trusted")
+    parser.add_argument("--round_size", type=int, default=500,
+                        help="Images per inference round")
+    parser.add_argument("--max_images", type=int, default=None,
+                        help="Stop once this many images are scheduled in total")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Order of the images within each cell")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    z = NormalDist().inv_cdf(1 - args.alpha / 2)
+    gt = GTIndex(args.gt)
+    n_ids = len(gt.codes["age"])
+    cells = cell_index(gt)
+
+    paths_by_cell, seen = {}, set()
+    for img_path in list_images(args.data, args.manifest):
+        try:
+            image_id = image_id_from_path(img_path)
+        except ValueError:
+            continue
+        if image_id >= n_ids or cells[image_id] < 0:
+            continue
+        if image_id in seen:
+            raise SystemExit(f"image_id {image_id} appears twice under {args.data}: point --data at one split")
+        seen.add(image_id)
+        paths_by_cell.setdefault(int(cells[image_id]), []).append(img_path)
+    print(f"[INFO] {len(seen)} images with GT in {len(paths_by_cell)} cells")
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    schedule_path = os.path.join(args.out_dir, "schedule.txt")
+    round_path = os.path.join(args.out_dir, "round.txt")
+    report_path = os.path.join(args.out_dir, "cells.json")
+    scheduled = read_image_list(schedule_path) if os.path.exists(schedule_path) else []
+
+    watched = {}
+    for model in args.models:
+        out_path = os.path.join(args.out_dir, f"{model}.jsonl")
+        watched[model] = (out_path, Tail(out_path), CellMetrics(MODELS[model][0], n_ids, cells))
+
+    # A round is only written to the schedule once its inference is over. Of an
+    # interrupted round, images answered by every model are kept; the others go
+    # back to their cell's queue.
+    answered = set.intersection(*(completed_images(out_path) for out_path, _, _ in watched.values()))
+    known = {img_path for paths in paths_by_cell.values() for img_path in paths}
+    interrupted = sorted((answered & known) - set(scheduled))
+    if interrupted:
+        with open(schedule_path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{img_path}\n" for img_path in interrupted))
+        scheduled += interrupted
+    if scheduled:
+        print(f"[INFO] Resuming after {len(scheduled)} scheduled images "
+              f"({len(interrupted)} from an interrupted round)")
+
+    scheduler = StratifiedScheduler(paths_by_cell, args.seed, scheduled)
+    metrics = {MODELS[model][0]: running for model, (_, _, running) in watched.items()}
+
+    t0 = time.perf_counter()
+    round_index = 0
+    while True:
+        for out_path, tail, running in watched.values():
+            lines, restarted = tail.read_new_lines()
+            if restarted:
+                running.reset(n_ids)
+            running.update(lines, gt)
+
+        report = cell_report(metrics, args.tasks, z, scheduler, args.target_width, args.min_per_cell)
+        status = {s: sum(c["status"] == s for c in report) for s in ("done", "exhausted", "open")}
+        write_snapshot({"time": time.time(), "rounds": round_index, "scheduled": len(scheduled),
+                        "target_width": args.target_width, "alpha": args.alpha, "cells": report}, report_path)
+        print(f"[INFO] {len(scheduled)} images scheduled: {status['done']} cells done, "
+              f"{status['exhausted']} exhausted, {status['open']} open")
+
+        budget = args.round_size
+        if args.max_images is not None:
+            budget = min(budget, args.max_images - len(scheduled))
+        if not status["open"]:
+            if status["exhausted"]:
+                reason = (f"{status['exhausted']} cells ran out of images before reaching the target, "
+                          f"the other {status['done']} reached it")
+            else:
+                reason = "every cell reached the target"
+            break
+        if budget <= 0:
+            reason = "image budget reached"
+            break
+
+        images = scheduler.next_round(budget, metrics, args.tasks, z, args.target_width, args.min_per_cell)
+        if not images:
+            reason = "no open cell has images left"
+            break
+        with open(round_path, "w", encoding="utf-8") as f:
+            f.write("".join(f"{img_path}\n" for img_path in images))
+        round_index += 1
+
+        print(f"[INFO] Round {round_index}: {len(images)} images")
+        for model, (out_path, _, _) in watched.items():
+            run_inference(model, args.data, out_path, round_path, shlex.split(getattr(args, f"{model}_args")))
+
+        with open(schedule_path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{img_path}\n" for img_path in images))
+        scheduled += images
+
+    print(f"[INFO] Stopped after {round_index} rounds ({reason}): {len(scheduled)} of "
+          f"{int(scheduler.available.sum())} images in {time.perf_counter() - t0:.1f}s")
+    print(f"[INFO] Cell report saved to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
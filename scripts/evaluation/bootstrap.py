@@ -0,0 +1,127 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from metrics import TASK_LABELS, age_scores_from_counts, confusion_counts, encode_frame, scores_from_counts
+
+# Every reported metric is a function of the confusion counts, and resampling n
+# images with replacement then counting them per cell is exactly a
+# Multinomial(n, observed cell frequencies) draw. Replicates are therefore
+# drawn directly as cell counts instead of going through a B x n index matrix.
+# For paired resampling the cells are the joint (model A cell, model B cell, ...)
+# tuples of each image, so every model sees the same resampled images.
+
+
+def _draw_counts(args):
+    seed, n, pvals, size, onehots = args
+    counts = np.random.default_rng(seed).multinomial(n, pvals, size=size)
+    # Project joint-cell counts back onto each model's confusion cells
+    return [(counts @ onehot).astype(np.int64) for onehot in onehots]
+
+
+def draw_replicates(cell_columns, n_cells, replicates, workers=1, seed=0, chunk=500):
+    # cell_columns: one array of per-image confusion cell codes per model, aligned
+    # on the same images. Returns one (replicates, n_cells) count array per model.
+    joint = np.stack(cell_columns, axis=1)
+    uniq, observed = np.unique(joint, axis=0, return_counts=True)
+    n = int(observed.sum())
+    pvals = observed / n
+
+    onehots = []
+    for j in range(joint.shape[1]):
+        onehot = np.zeros((len(uniq), n_cells))
+        onehot[np.arange(len(uniq)), uniq[:, j]] = 1
+        onehots.append(onehot)
+
+    sizes = [min(chunk, replicates - start) for start in range(0, replicates, chunk)]
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = seed.spawn(len(sizes))
+    jobs = [(s, n, pvals, size, onehots) for s, size in zip(seeds, sizes)]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_draw_counts, jobs))
+    else:
+        parts = [_draw_counts(job) for job in jobs]
+
+    return [np.concatenate([part[j] for part in parts]) for j in range(joint.shape[1])]
+
+
+def replicate_scores(cm, task):
+    # Metric name -> value (or array of replicate values for stacked matrices)
+    labels = TASK_LABELS[task]
+    scores = scores_from_counts(cm)
+    out = {"accuracy": scores["accuracy"], "macro_f1": scores["macro_f1"]}
+    for i, label in enumerate(labels):
+        out[f"recall/{label}"] = scores["recall"][..., i]
+    if task == "age":
+        out.update(age_scores_from_counts(cm))
+    return out
+
+
+def summarize(point, samples, alpha):
+    low, high = np.nanpercentile(samples, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return {"estimate": float(point), "ci_low": float(low), "ci_high": float(high)}
+
+
+def bootstrap_report(frames, replicates=10000, workers=1, alpha=0.05, seed=0, paired=True):
+    # {"models": {model: {task: {metric: CI}}}, "differences": {"B - A": {task: {metric: CI}}}}
+    # Differences against the first model are only reported for paired resampling.
+    names = list(frames)
+
+    if paired:
+        common = set.intersection(*(set(df["image_id"]) for df in frames.values()))
+        frames = {
+            name: df[df["image_id"].isin(common)].sort_values("image_id").reset_index(drop=True)
+            for name, df in frames.items()
+        }
+
+    codes = {name: encode_frame(df) for name, df in frames.items()}
+
+    report = {"replicates": replicates, "alpha": alpha, "paired": paired,
+              "models": {name: {} for name in names}}
+    if paired and len(names) > 1:
+        report["differences"] = {f"{name} - {names[0]}": {} for name in names[1:]}
+
+    for t_index, (task, labels) in enumerate(TASK_LABELS.items()):
+        k = len(labels)
+        shape = (k, k + 1)
+        task_seed = seed + t_index
+
+        cells, points = {}, {}
+        for name in names:
+            y_true, y_pred = codes[name][task]
+            # GT labels outside the taxonomy are not part of any confusion matrix
+            keep = y_true < k
+            cells[name] = y_true[keep] * (k + 1) + y_pred[keep]
+            points[name] = replicate_scores(confusion_counts(y_true, y_pred, k), task)
+
+        if paired:
+            drawn = draw_replicates([cells[name] for name in names], k * (k + 1),
+                                    replicates, workers, task_seed)
+        else:
+            # Independent streams: a shared seed would make the models' replicates correlated
+            model_seeds = np.random.SeedSequence(task_seed).spawn(len(names))
+            drawn = [draw_replicates([cells[name]], k * (k + 1), replicates, workers, model_seed)[0]
+                     for name, model_seed in zip(names, model_seeds)]
+
+        samples = {
+            name: replicate_scores(counts.reshape(replicates, *shape), task)
+            for name, counts in zip(names, drawn)
+        }
+
+        for name in names:
+            report["models"][name][task] = {
+                metric: summarize(points[name][metric], values, alpha)
+                for metric, values in samples[name].items()
+            }
+
+        for name in names[1:] if "differences" in report else []:
+            report["differences"][f"{name} - {names[0]}"][task] = {
+                metric: summarize(points[name][metric] - points[names[0]][metric],
+                                  samples[name][metric] - samples[names[0]][metric], alpha)
+                for metric in samples[name]
+            }
+
+    return report
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+from metrics import TASKS, encode
+
+# Confidence column per task, first available one wins.
+# DeepFace has no age confidence: face_confidence is used instead (as in the paper).
+CONFIDENCE_COLUMNS = {
+    "gender": ("gender_confidence",),
+    "race": ("race_confidence",),
+    "age": ("age_confidence", "face_confidence"),
+}
+
+# Columns that DeepFace CSVs store as percentages
+PERCENT_COLUMNS = {"gender_confidence", "race_confidence"}
+
+
+def confidence_values(df, task):
+    # Confidence in [0, 1] as float64. DeepFace CSVs store percentages, Parquet
+    # outputs of normalize_stream.py are already in [0, 1].
+    for column in CONFIDENCE_COLUMNS[task]:
+        if column in df and df[column].notna().any():
+            conf = df[column].to_numpy(dtype=np.float64)
+            if column in PERCENT_COLUMNS and np.nanmax(conf) > 1:
+                conf = conf / 100
+            # face_confidence can slightly exceed 1 (e.g. 1.01). Rounding keeps
+            # float32 values such as 0.8 from landing just above their bin edge.
+            return np.round(np.clip(conf, 0, 1), 6)
+    raise KeyError(f"No confidence column for task '{task}' (tried {CONFIDENCE_COLUMNS[task]})")
+
+
+def bin_index(conf, n_bins):
+    # Right-closed uniform bins over [0, 1]: [0, 0.1], (0.1, 0.2], ..., (0.9, 1.0]
+    edges = np.linspace(0, 1, n_bins + 1)
+    return np.clip(np.digitize(conf, edges[1:-1], right=True), 0, n_bins - 1)
+
+
+def calibration_stats(conf, correct, n_bins=10):
+    # Per-bin counts / mean confidence / accuracy and ECE, MCE, top-label Brier score
+    valid = ~np.isnan(conf)
+    conf, correct = conf[valid], correct[valid].astype(np.float64)
+    bins = bin_index(conf, n_bins)
+
+    count = np.bincount(bins, minlength=n_bins)
+    conf_sum = np.bincount(bins, weights=conf, minlength=n_bins)
+    correct_sum = np.bincount(bins, weights=correct, minlength=n_bins)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_conf = conf_sum / count
+        accuracy = correct_sum / count
+
+    gap = np.abs(accuracy - mean_conf)
+    filled = count > 0
+    n = count.sum()
+
+    edges = np.linspace(0, 1, n_bins + 1).round(6)
+    table = pd.DataFrame({
+        "bin_low": edges[:-1],
+        "bin_high": edges[1:],
+        "count": count,
+        "mean_confidence": mean_conf,
+        "accuracy": accuracy,
+    })[filled]
+
+    summary = {
+        "n": int(n),
+        "accuracy": float(correct.mean()) if n else float("nan"),
+        "mean_confidence": float(conf.mean()) if n else float("nan"),
+        "ece": float(np.sum(gap[filled] * count[filled]) / n) if n else float("nan"),
+        "mce": float(gap[filled].max()) if n else float("nan"),
+        "brier": float(np.mean((conf - correct) ** 2)) if n else float("nan"),
+    }
+    return summary, table
+
+
+def calibration_tables(frames, n_bins=10):
+    # Every model x task in one pass. Returns (summary, reliability bins) tidy DataFrames.
+    summaries, tables = [], []
+    for model, df in frames.items():
+        for task in TASKS:
+            correct = encode(df[f"{task}_gt"], task) == encode(df[f"{task}_pred"], task)
+            summary, table = calibration_stats(confidence_values(df, task), correct, n_bins)
+            summaries.append({"model": model, "task": task, **summary})
+            tables.append(table.assign(model=model, task=task))
+
+    summary = pd.DataFrame(summaries)
+    bins = pd.concat(tables, ignore_index=True)[
+        ["model", "task", "bin_low", "bin_high", "count", "mean_confidence", "accuracy"]
+    ]
+    return summary, bins
+
+
+def plot_reliability(summary, bins, out_dir):
+    # One reliability diagram per model x task, written without a display
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    paths = []
+    for row in summary.itertuples():
+        table = bins[(bins["model"] == row.model) & (bins["task"] == row.task)]
+
+        fig, ax = plt.subplots()
+        ax.plot([0, 1], [0, 1])
+        ax.plot(table["mean_confidence"], table["accuracy"], marker="o")
+        ax.set_xlabel("Confidence")
+        ax.set_ylabel("Accuracy")
+        ax.set_title(f"{row.model} - {row.task} (ECE={row.ece:.4f})")
+        ax.set_xlim(0, 1)
+        ax.set_ylim(0, 1)
+
+        path = f"{out_dir}/{row.model.capitalize()}_{row.task}_confidence.png"
+        fig.savefig(path, dpi=100, bbox_inches="tight")
+        plt.close(fig)
+        paths.append(path)
+    return paths
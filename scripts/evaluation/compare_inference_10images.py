@@ -1,68 +1,64 @@
+import argparse
 import os
-import json
-import csv
-import re
+import sys
+from pathlib import Path
 
-def extract_age(s: str) -> int:
+import numpy as np
 
-    # range like "5-7 years" or 30-40
-    nombres = re.findall(r"\d+", s)
-    a, b = map(int, nombres[:2])
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.prediction_store import PredictionStore  # noqa: E402
+from common.taxonomy import AGE_BINS, encode  # noqa: E402
 
-    return (a + b) // 2
+# Side-by-side FaceLLM / DeepFace predictions for a handful of images, read
+# with one indexed query from the prediction store (see build_store.py).
 
-FACELLM_DIR = "results/facellm_parsed"
-DEEPFACE_DIR = "results/deepface"
-OUT_DIR = "results/comparison"
-os.makedirs(OUT_DIR, exist_ok=True)
 
-rows = []
+def parse_args():
+    parser = argparse.ArgumentParser("Per-image FaceLLM vs DeepFace comparison")
 
-for fname in sorted(os.listdir(FACELLM_DIR)):
-    if not fname.endswith(".json"):
-        continue
+    parser.add_argument("--store", type=str, default="results/predictions.sqlite",
+                        help="Prediction store")
+    parser.add_argument("--facellm_run", type=str, default=None,
+                        help="FaceLLM run id (default: latest)")
+    parser.add_argument("--deepface_run", type=str, default=None,
+                        help="DeepFace run id (default: latest)")
+    parser.add_argument("--image_ids", type=int, nargs="+", default=None,
+                        help="Images to compare (default: the first --limit shared images)")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--out_dir", type=str, default="results/comparison")
 
-    img_id = fname.replace(".json", "")
+    return parser.parse_args()
 
-    with open(os.path.join(FACELLM_DIR, fname)) as f:
-        facellm = json.load(f)
 
-    with open(os.path.join(DEEPFACE_DIR, fname)) as f:
-        deepface = json.load(f)[0]  # DeepFace returns a list
+def main():
+    args = parse_args()
 
-    age_f = facellm.get("age")
-    age_d = deepface.get("age")
+    with PredictionStore(args.store) as store:
+        latest = store.latest_runs()
+        facellm_run = args.facellm_run or latest["FaceLLM"]
+        deepface_run = args.deepface_run or latest["DeepFace"]
+        limit = args.limit if args.image_ids is None else None
+        df = store.compare([facellm_run, deepface_run], args.image_ids, limit)
 
-    gender_f = facellm.get("gender")
-    gender_d = deepface.get("dominant_gender")
+    out = df[["image_id"]].copy()
+    for task in ["age", "gender", "race"]:
+        f, d = df[f"{task}_{facellm_run}"], df[f"{task}_{deepface_run}"]
+        out[f"{task}_facellm"] = f
+        out[f"{task}_deepface"] = d
+        if task == "age":
+            # Distance in FairFace age bins (empty when either age is unknown)
+            codes_f, codes_d = encode(f, "age"), encode(d, "age")
+            known = (codes_f < len(AGE_BINS)) & (codes_d < len(AGE_BINS))
+            out["age_bin_diff"] = np.where(known, np.abs(codes_f - codes_d), np.nan)
+        else:
+            out[f"{task}_match"] = (f == d).astype(int)
 
-    race_f = facellm.get("race")
-    race_d = deepface.get("dominant_race")
+    os.makedirs(args.out_dir, exist_ok=True)
+    out_path = os.path.join(args.out_dir, "summary.csv")
+    out.to_csv(out_path, index=False)
 
-    expression_f = facellm.get("expression")
-    expression_d = deepface.get("dominant_emotion")
+    print(f"[OK] Comparison saved to {out_path}")
 
-    rows.append({
-        "image_id": img_id,
-        "age_facellm": age_f,
-        "age_deepface": age_d,
-        "age_abs_diff": abs(extract_age(age_f) - age_d) if age_f is not None and age_d is not None else None,
-        "gender_facellm": gender_f,
-        "gender_deepface": gender_d,
-        "gender_match": int(gender_f == gender_d) if gender_f and gender_d else None,
-        "race_facellm": race_f,
-        "race_deepface": race_d,
-        "race_match": int(race_f == race_d) if race_f and race_d else None,
-	"expression_facellm": expression_f,
-	"expression_deepface": expression_d,
-	"expression_match": int(expression_f == expression_d) if expression_f and expression_d else None
-    })
 
-out_path = os.path.join(OUT_DIR, "summary.csv")
-
-with open(out_path, "w", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-    writer.writeheader()
-    writer.writerows(rows)
-
-print(f"[OK] Comparison saved to {out_path}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
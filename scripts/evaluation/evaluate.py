@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Metrics for every model x task")
+
+    parser.add_argument("--gt", type=str, default="data/fairface_3k/train_labels_inferred_only.csv",
+                        help="Ground-truth labels (CSV or Parquet)")
+    parser.add_argument("--deepface", type=str, default="data/fairface_3k/deepface_3k.csv",
+                        help="Normalized DeepFace predictions (CSV or Parquet)")
+    parser.add_argument("--facellm", type=str, default="data/fairface_3k/facellm_3k.csv",
+                        help="Normalized FaceLLM predictions (CSV or Parquet)")
+    parser.add_argument("--store", type=str, default=None,
+                        help="Read GT and predictions from this prediction store instead of the files above")
+    parser.add_argument("--runs", type=str, nargs="+", default=None,
+                        help="Store runs to evaluate (default: latest run of every model)")
+    parser.add_argument("--out", type=str, default="results/metrics/report.json",
+                        help="Output JSON report")
+
+    parser.add_argument("--bootstrap", type=int, default=0,
+                        help="Number of bootstrap replicates for confidence intervals (0: off)")
+    parser.add_argument("--bootstrap_out", type=str, default="results/metrics/bootstrap.json",
+                        help="Output JSON with the bootstrap intervals")
+    parser.add_argument("--alpha", type=float, default=0.05,
+                        help="Intervals cover 1 - alpha")
+    parser.add_argument("--unpaired", action="store_true",
+                        help="Resample each model independently instead of on shared images")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes used to draw bootstrap replicates")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Bootstrap random seed")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Imported after parsing: they pull in pandas, --help does not need it
+    from bootstrap import bootstrap_report
+    from metrics import TASKS, evaluate, load_eval_frames, load_store_frames, save_report
+
+    if args.store:
+        frames = load_store_frames(args.store, args.runs)
+    else:
+        frames = load_eval_frames(args.gt, {"DeepFace": args.deepface, "FaceLLM": args.facellm})
+    report = evaluate(frames)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    save_report(report, args.out)
+
+    for model, tasks in report.items():
+        summary = ", ".join(
+            f"{task} acc={tasks[task]['accuracy']:.4f} f1={tasks[task]['macro_f1']:.4f}" for task in TASKS
+        )
+        print(f"[INFO] {model}: {summary}")
+    print(f"[INFO] Report saved to {args.out}")
+
+    if args.bootstrap > 0:
+        t0 = time.perf_counter()
+        intervals = bootstrap_report(frames, args.bootstrap, args.workers, args.alpha,
+                                     args.seed, paired=not args.unpaired)
+        os.makedirs(os.path.dirname(os.path.abspath(args.bootstrap_out)), exist_ok=True)
+        save_report(intervals, args.bootstrap_out)
+
+        for diff, tasks in intervals.get("differences", {}).items():
+            for task in TASKS:
+                for metric in ("accuracy", "macro_f1"):
+                    ci = tasks[task][metric]
+                    print(f"[INFO] {diff} {task} {metric}: {ci['estimate']:+.4f} "
+                          f"[{ci['ci_low']:+.4f}, {ci['ci_high']:+.4f}]")
+        print(f"[INFO] {args.bootstrap} replicates in {time.perf_counter() - t0:.1f}s "
+              f"saved to {args.bootstrap_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.prediction_store import PredictionStore  # noqa: E402
+from common.taxonomy import AGE_BINS, TASK_LABELS, TASKS, encode, encode_ages, harmonize  # noqa: E402,F401
+
+# Ordinal tolerance reported for age (±k bins)
+AGE_TOLERANCES = (1, 2)
+
+
+def read_table(path):
+    if str(path).endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def load_gt(path):
+    gt = read_table(path)
+
+    # Raw FairFace labels identify images by file ("train/123.jpg")
+    if "image_id" not in gt and "file" in gt:
+        gt["image_id"] = gt["file"]
+    if not pd.api.types.is_integer_dtype(gt["image_id"]):
+        gt["image_id"] = gt["image_id"].str.extract(r"(\d+)\.\w+$", expand=False).astype(int)
+
+    # Ids are file name stems: train/N.jpg and val/N.jpg would share one
+    duplicated = gt["image_id"].duplicated()
+    if duplicated.any():
+        raise ValueError(f"{path}: image_id {gt['image_id'][duplicated].iloc[0]} appears more than once "
+                         f"({int(duplicated.sum())} duplicates), keep the labels of one FairFace split")
+
+    gt = gt.rename(columns={"gender": "gender_gt", "race": "race_gt", "age": "age_gt"})
+
+    # Label alignment (East/Southeast Asian -> Asian, "more than 70" -> "70+")
+    for task in TASKS:
+        gt[f"{task}_gt"] = harmonize(gt[f"{task}_gt"], task)
+    return gt
+
+
+def load_eval_frames(gt_path, prediction_paths):
+    # {model name: GT + predictions merged on image_id}
+    gt = load_gt(gt_path)
+    frames = {}
+    for name, path in prediction_paths.items():
+        pred = read_table(path)
+        pred = pred.rename(columns={"gender": "gender_pred", "race": "race_pred", "age": "age_pred"})
+        frames[name] = gt.merge(pred, on="image_id", how="inner")
+    return frames
+
+
+def load_store_frames(store_path, runs=None):
+    # Same as load_eval_frames, read from the prediction store. Without explicit
+    # runs, the latest run of every model is used and keyed by model name.
+    with PredictionStore(store_path) as store:
+        if runs:
+            return {run_id: store.eval_frame(run_id) for run_id in runs}
+        return {model: store.eval_frame(run_id) for model, run_id in store.latest_runs().items()}
+
+
+def encode_frame(df):
+    # {task: (gt codes, pred codes)}, computed once per model
+    return {
+        task: (encode(df[f"{task}_gt"], task), encode(df[f"{task}_pred"], task))
+        for task in TASKS
+    }
+
+
+def confusion_counts(y_true, y_pred, n_labels):
+    # Rows: GT labels, columns: predicted labels + one "unknown" column
+    k = n_labels + 1
+    counts = np.bincount(y_true * k + y_pred, minlength=k * k).reshape(k, k)
+    return counts[:n_labels]
+
+
+def scores_from_counts(cm):
+    # cm: (..., K, K+1) confusion counts; leading axes are kept (e.g. bootstrap replicates)
+    n_labels = cm.shape[-2]
+    cm = cm.astype(np.float64)
+    tp = np.diagonal(cm[..., :n_labels], axis1=-2, axis2=-1)
+    support = cm.sum(axis=-1)
+    predicted = cm[..., :n_labels].sum(axis=-2)
+    total = support.sum(axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        recall = np.where(support > 0, tp / support, 0.0)
+        precision = np.where(predicted > 0, tp / predicted, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        accuracy = tp.sum(axis=-1) / total
+
+    # Macro average over labels seen in GT or predictions (scikit-learn convention)
+    present = (support > 0) | (predicted > 0)
+    macro_f1 = (f1 * present).sum(axis=-1) / np.maximum(present.sum(axis=-1), 1)
+
+    return {
+        "accuracy": accuracy,
+        "macro_f1": macro_f1,
+        "recall": recall,
+        "precision": precision,
+        "f1": f1,
+    }
+
+
+def age_scores_from_counts(cm):
+    # Ordinal metrics from (..., K, K+1) age confusion counts; "unknown" predictions are excluded
+    n_bins = cm.shape[-2]
+    idx = np.arange(n_bins)
+    dist = np.abs(idx[:, None] - idx[None, :])
+    known = cm[..., :n_bins].astype(np.float64)
+    total = known.sum(axis=(-2, -1))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = {"mae_bins": (known * dist).sum(axis=(-2, -1)) / total}
+        for k in AGE_TOLERANCES:
+            scores[f"within_{k}_bins"] = (known * (dist <= k)).sum(axis=(-2, -1)) / total
+    return scores
+
+
+def evaluate(frames):
+    # Machine-readable report: {model: {task: metrics}}
+    report = {}
+    for name, df in frames.items():
+        codes = encode_frame(df)
+        report[name] = {}
+        for task, labels in TASK_LABELS.items():
+            y_true, y_pred = codes[task]
+            cm = confusion_counts(y_true, y_pred, len(labels))
+            scores = scores_from_counts(cm)
+
+            entry = {
+                "n": int(cm.sum()),
+                "accuracy": float(scores["accuracy"]),
+                "macro_f1": float(scores["macro_f1"]),
+                "recall": dict(zip(labels, scores["recall"].round(6).tolist())),
+                "precision": dict(zip(labels, scores["precision"].round(6).tolist())),
+                "labels": labels,
+                "confusion": cm.tolist(),
+            }
+            if task == "age":
+                entry.update({k: float(v) for k, v in age_scores_from_counts(cm).items()})
+            report[name][task] = entry
+    return report
+
+
+def normalized_confusion(entry):
+    # Row-normalized K x K matrix (the "unknown" column is dropped, as in the paper figures)
+    cm = np.asarray(entry["confusion"], dtype=np.float64)[:, :-1]
+    rows = cm.sum(axis=1, keepdims=True)
+    return np.divide(cm, rows, out=np.zeros_like(cm), where=rows > 0)
+
+
+def save_report(report, path):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,50 @@
+import argparse
+import os
+
+from metrics import load_eval_frames, load_store_frames
+from subgroups import subgroup_cube
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Intersectional race x gender x age subgroup metrics")
+
+    parser.add_argument("--gt", type=str, default="data/fairface_3k/train_labels_inferred_only.csv",
+                        help="Ground-truth labels (CSV or Parquet)")
+    parser.add_argument("--deepface", type=str, default="data/fairface_3k/deepface_3k.csv",
+                        help="Normalized DeepFace predictions (CSV or Parquet)")
+    parser.add_argument("--facellm", type=str, default="data/fairface_3k/facellm_3k.csv",
+                        help="Normalized FaceLLM predictions (CSV or Parquet)")
+    parser.add_argument("--store", type=str, default=None,
+                        help="Read GT and predictions from this prediction store instead of the files above")
+    parser.add_argument("--runs", type=str, nargs="+", default=None,
+                        help="Store runs to evaluate (default: latest run of every model)")
+    parser.add_argument("--out", type=str, default="results/metrics/subgroups.csv",
+                        help="Output table (.csv or .parquet)")
+    parser.add_argument("--min_count", type=int, default=30,
+                        help="Subgroups with fewer images get masked metrics")
+    parser.add_argument("--bins", type=int, default=10,
+                        help="Number of confidence bins for the ECE")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.store:
+        frames = load_store_frames(args.store, args.runs)
+    else:
+        frames = load_eval_frames(args.gt, {"DeepFace": args.deepface, "FaceLLM": args.facellm})
+    table = subgroup_cube(frames, args.bins, args.min_count)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    if args.out.endswith(".parquet"):
+        table.to_parquet(args.out, index=False)
+    else:
+        table.to_csv(args.out, index=False)
+
+    print(f"[INFO] {len(table)} subgroup rows ({int(table['masked'].sum())} masked) saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
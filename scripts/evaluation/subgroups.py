@@ -0,0 +1,104 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from calibration import bin_index, confidence_values
+from metrics import TASK_LABELS, age_scores_from_counts, encode, encode_frame, scores_from_counts
+
+# Subgroups are defined on the GT attributes. All counts are accumulated once
+# per finest race x gender x age cell; every marginal (race only, race x gender,
+# ..., overall) is then a sum over axes of that cube.
+GROUP_DIMS = ["race", "gender", "age"]
+ALL = "all"
+
+
+def finest_cells(df):
+    # Integer id of each image's GT race x gender x age cell (-1 when outside the taxonomy)
+    ids = np.zeros(len(df), dtype=np.int64)
+    valid = np.ones(len(df), dtype=bool)
+    for dim in GROUP_DIMS:
+        labels = TASK_LABELS[dim]
+        codes = encode(df[f"{dim}_gt"], dim)
+        valid &= codes < len(labels)
+        ids = ids * len(labels) + codes
+    ids[~valid] = -1
+    return ids
+
+
+def cube_counts(cells, values, n_values, weights=None):
+    # (R, G, A, n_values) sums of `weights` (or counts) per finest cell and value
+    shape = [len(TASK_LABELS[dim]) for dim in GROUP_DIMS]
+    n_cells = int(np.prod(shape))
+    keep = cells >= 0
+    flat = np.bincount(
+        cells[keep] * n_values + values[keep],
+        weights=None if weights is None else weights[keep],
+        minlength=n_cells * n_values,
+    )
+    return flat.reshape(*shape, n_values)
+
+
+def marginals(cube):
+    # Yields (grouping dims, array with one leading axis per grouping dim) for all 2^3 groupings
+    for r in range(len(GROUP_DIMS), -1, -1):
+        for dims in combinations(range(len(GROUP_DIMS)), r):
+            summed = tuple(i for i in range(len(GROUP_DIMS)) if i not in dims)
+            yield dims, cube.sum(axis=summed) if summed else cube
+
+
+def subgroup_cube(frames, n_bins=10, min_count=30):
+    # Tidy table: one row per model x task x subgroup (intersections and marginals)
+    rows = []
+
+    for model, df in frames.items():
+        cells = finest_cells(df)
+        codes = encode_frame(df)
+
+        for task, labels in TASK_LABELS.items():
+            k = len(labels)
+            y_true, y_pred = codes[task]
+            valid = y_true < k
+            task_cells = np.where(valid, cells, -1)
+
+            confusion = cube_counts(task_cells, np.where(valid, y_true * (k + 1) + y_pred, 0), k * (k + 1))
+            confusion = confusion.reshape(*confusion.shape[:-1], k, k + 1)
+
+            conf = confidence_values(df, task)
+            has_conf = ~np.isnan(conf)
+            conf_cells = np.where(has_conf, task_cells, -1)
+            bins = bin_index(np.nan_to_num(conf), n_bins)
+            correct = (y_true == y_pred).astype(np.float64)
+            calib = np.stack([
+                cube_counts(conf_cells, bins, n_bins),
+                cube_counts(conf_cells, bins, n_bins, np.nan_to_num(conf)),
+                cube_counts(conf_cells, bins, n_bins, correct),
+            ], axis=-1)
+
+            for (dims, cm), (_, cal) in zip(marginals(confusion), marginals(calib)):
+                scores = scores_from_counts(cm)
+                n = cm.sum(axis=(-2, -1))
+                extra = age_scores_from_counts(cm) if task == "age" else {}
+
+                count, conf_sum, correct_sum = cal[..., 0], cal[..., 1], cal[..., 2]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    gap = np.abs(correct_sum - conf_sum)
+                    ece = gap.sum(axis=-1) / count.sum(axis=-1)
+
+                for index in np.ndindex(*n.shape):
+                    row = {"model": model, "task": task}
+                    for i, dim in enumerate(GROUP_DIMS):
+                        row[dim] = TASK_LABELS[dim][index[dims.index(i)]] if i in dims else ALL
+                    row["n"] = int(n[index])
+                    masked = row["n"] < min_count
+                    row["masked"] = masked
+                    row["accuracy"] = np.nan if masked else float(scores["accuracy"][index])
+                    row["macro_f1"] = np.nan if masked else float(scores["macro_f1"][index])
+                    row["ece"] = np.nan if masked else float(ece[index])
+                    for name, values in extra.items():
+                        row[name] = np.nan if masked else float(values[index])
+                    rows.append(row)
+
+    table = pd.DataFrame(rows)
+    columns = ["model", "task"] + GROUP_DIMS + ["n", "masked", "accuracy", "macro_f1", "ece"]
+    return table[columns + [c for c in table.columns if c not in columns]]
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+# Live evaluation of running inference jobs.
+# Tails the raw JSONL outputs, parses only the lines appended since the last
+# poll and updates running confusion counts against a GT index preloaded in
+# memory (one code array per task, indexed by image_id). A metrics snapshot is
+# rewritten atomically after every poll.
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from metrics import TASK_LABELS, age_scores_from_counts, encode, encode_ages, load_gt, scores_from_counts
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.raw_outputs import image_id_from_path, parse_facellm_json  # noqa: E402
+
+
+# Parsers return raw labels; they are mapped to taxonomy codes in bulk.
+# DeepFace gives a numeric age, FaceLLM an age bin.
+
+def parse_deepface(raw):
+    raw = raw[0]
+    return {"gender": raw["dominant_gender"], "race": raw["dominant_race"], "age": raw["age"]}
+
+
+def parse_facellm(raw):
+    raw = parse_facellm_json(raw)
+    return {"gender": raw["gender"], "race": raw["ethnicity"], "age": raw["age_range"]}
+
+
+PARSERS = {"DeepFace": parse_deepface, "FaceLLM": parse_facellm}
+NUMERIC_AGE = {"DeepFace"}
+
+
+class GTIndex:
+
+    def __init__(self, path):
+        gt = load_gt(path)
+        ids = gt["image_id"].to_numpy()
+        self.codes = {}
+        for task in TASK_LABELS:
+            codes = np.full(ids.max() + 1, -1, dtype=np.int64)
+            codes[ids] = encode(gt[f"{task}_gt"], task)
+            self.codes[task] = codes
+
+    def lookup(self, image_ids):
+        image_ids = np.asarray(image_ids, dtype=np.int64)
+        inside = image_ids < len(self.codes["age"])
+        safe = np.where(inside, image_ids, 0)
+        return {task: np.where(inside, codes[safe], -1) for task, codes in self.codes.items()}
+
+
+class Tail:
+    # Reads complete lines appended to a file since the previous call
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+
+    def read_new_lines(self):
+        if not os.path.exists(self.path):
+            return [], False
+        size = os.path.getsize(self.path)
+        restarted = size < self.offset  # file was truncated or replaced
+        if restarted:
+            self.offset = 0
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+
+        end = data.rfind(b"\n") + 1  # keep a partially written last line for later
+        self.offset += end
+        return data[:end].decode("utf-8").splitlines(), restarted
+
+
+class RunningMetrics:
+
+    def __init__(self, model, n_ids):
+        self.model = model
+        self.parse = PARSERS[model]
+        self.reset(n_ids)
+
+    def reset(self, n_ids):
+        self.seen = np.zeros(n_ids, dtype=bool)
+        self.counts = {task: np.zeros((len(l), len(l) + 1), dtype=np.int64)
+                       for task, l in TASK_LABELS.items()}
+        self.stats = {"records": 0, "ok": 0, "errors": 0, "unparsable": 0,
+                      "no_gt": 0, "duplicates": 0}
+
+    def decode(self, lines, gt):
+        # New records -> (image ids with GT, {task: (GT codes, predicted codes)})
+        ids, preds = [], {task: [] for task in TASK_LABELS}
+
+        for line in lines:
+            self.stats["records"] += 1
+            try:
+                record = json.loads(line)
+            except ValueError:
+                self.stats["unparsable"] += 1
+                continue
+            if record.get("status") != "ok":
+                self.stats["errors"] += 1
+                continue
+            try:
+                image_id = image_id_from_path(record["image_path"])
+                labels = self.parse(record["raw_output"])
+            except (ValueError, KeyError, IndexError, TypeError):
+                self.stats["unparsable"] += 1
+                continue
+
+            if image_id < len(self.seen) and self.seen[image_id]:
+                self.stats["duplicates"] += 1
+                continue
+            if image_id < len(self.seen):
+                self.seen[image_id] = True
+
+            self.stats["ok"] += 1
+            ids.append(image_id)
+            for task in TASK_LABELS:
+                preds[task].append(labels[task])
+
+        gt_codes = gt.lookup(ids)
+        has_gt = gt_codes["age"] >= 0
+        self.stats["no_gt"] += int((~has_gt).sum())
+
+        codes = {}
+        for task in TASK_LABELS:
+            values = np.asarray(preds[task], dtype=object)[has_gt]
+            if task == "age" and self.model in NUMERIC_AGE:
+                y_pred = encode_ages(values)
+            else:
+                y_pred = encode(values, task)
+            codes[task] = (gt_codes[task][has_gt], y_pred)
+        return np.asarray(ids, dtype=np.int64)[has_gt], codes
+
+    def update(self, lines, gt):
+        _, codes = self.decode(lines, gt)
+        for task, labels in TASK_LABELS.items():
+            k = len(labels)
+            y_true, y_pred = codes[task]
+            keep = y_true < k
+            self.counts[task] += np.bincount(
+                y_true[keep] * (k + 1) + y_pred[keep], minlength=k * (k + 1)
+            ).reshape(k, k + 1)
+
+    def snapshot(self):
+        out = {"stats": dict(self.stats)}
+        for task, cm in self.counts.items():
+            scores = scores_from_counts(cm)
+            entry = {"n": int(cm.sum()),
+                     "accuracy": float(scores["accuracy"]) if cm.sum() else None,
+                     "macro_f1": float(scores["macro_f1"]) if cm.sum() else None}
+            if task == "age" and cm.sum():
+                entry.update({k: float(v) for k, v in age_scores_from_counts(cm).items()})
+            out[task] = entry
+        return out
+
+
+def write_snapshot(snapshot, path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot, f, indent=2)
+    os.replace(tmp, path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Live metrics on growing inference outputs")
+
+    parser.add_argument("--gt", type=str, required=True,
+                        help="GT labels (FairFace train_labels.csv or a harmonized copy)")
+    parser.add_argument("--deepface", type=str, default=None,
+                        help="Raw DeepFace JSONL being written (e.g. results/raw/deepface_full.jsonl)")
+    parser.add_argument("--facellm", type=str, default=None,
+                        help="Raw FaceLLM JSONL being written (e.g. results/raw/facellm_full.jsonl)")
+    parser.add_argument("--snapshot", type=str, default="results/metrics/live.json",
+                        help="Metrics snapshot rewritten after every poll")
+    parser.add_argument("--interval", type=float, default=30,
+                        help="Seconds between polls")
+    parser.add_argument("--once", action="store_true",
+                        help="Process what is there now and exit")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    gt = GTIndex(args.gt)
+    n_ids = len(gt.codes["age"])
+
+    watched = {}
+    for model, path in [("DeepFace", args.deepface), ("FaceLLM", args.facellm)]:
+        if path:
+            watched[model] = (Tail(path), RunningMetrics(model, n_ids))
+    if not watched:
+        raise SystemExit("Nothing to watch: pass --deepface and/or --facellm")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.snapshot)), exist_ok=True)
+
+    while True:
+        snapshot = {"time": time.time()}
+        for model, (tail, running) in watched.items():
+            lines, restarted = tail.read_new_lines()
+            if restarted:
+                running.reset(n_ids)
+            running.update(lines, gt)
+            snapshot[model] = running.snapshot()
+
+            summary = ", ".join(
+                f"{task}={snapshot[model][task]['accuracy']:.3f}"
+                for task in TASK_LABELS if snapshot[model][task]["accuracy"] is not None
+            )
+            print(f"[INFO] {model}: {running.stats['ok']} ok, {running.stats['errors']} errors. {summary}")
+
+        write_snapshot(snapshot, args.snapshot)
+
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+
+# Throughput benchmark of the inference wrappers.
+# Every case drives the same code path as infer_deepface.py / infer_facellm.py
+# (record iteration, prefetching, worker protocol, JsonlWriter) against the
+# real models or the deterministic CPU stubs of stub_backends.py, and reports
+# model load time, images/sec, p50/p95/p99 per-image latency and peak RSS.
+# Each case runs in a fresh process so that peak RSS is its own.
+# Results are written as JSON (one file per commit by default) to compare runs.
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+CASES = {
+    "deepface_serial": {"model": "deepface", "workers": 1},
+    "deepface_prefetch": {"model": "deepface", "workers": 1, "prefetch_threads": 4},
+    "deepface_pool": {"model": "deepface", "workers": None},  # --workers
+    "deepface_batched": {"model": "deepface", "workers": 1, "batch_size": None,  # --batch_size
+                         "prefetch_threads": 4},
+    "facellm_subprocess": {"model": "facellm", "backend": "subprocess"},
+    "facellm_worker": {"model": "facellm", "backend": "worker", "batch_size": 1},
+    "facellm_worker_batched": {"model": "facellm", "backend": "worker", "batch_size": None,  # --batch_size
+                               "prefetch_threads": 2},
+}
+
+
+class TimedBackend:
+    # Wraps a DeepFace backend and reports each analyze() duration inside the
+    # result, so that it also comes back from pool workers
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def load(self, threads=None):
+        self.backend.load(threads)
+
+    def analyze(self, img):
+        t0 = time.perf_counter()
+        result = self.backend.analyze(img)
+        result[0]["_benchmark_seconds"] = time.perf_counter() - t0
+        return result
+
+    def analyze_batch(self, imgs):
+        # Batch time shared by its images
+        t0 = time.perf_counter()
+        results = self.backend.analyze_batch(imgs)
+        for result in results:
+            result[0]["_benchmark_seconds"] = (time.perf_counter() - t0) / len(imgs)
+        return results
+
+
+def write_synthetic_images(out_dir, n, size=224, seed=0):
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(os.path.join(out_dir, f"{i}.jpg"), quality=90)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def run_deepface(case, args, images, writer):
+    from infer_deepface import DeepFaceBackend, DeepFaceBatchBackend, iter_batched_records, iter_records
+    from prefetch import Prefetcher
+    from stub_backends import StubDeepFace
+
+    batched = case.get("batch_size") is not None
+    if args.backend == "stub":
+        model = StubDeepFace(args.load_s, args.latency_ms)
+    else:
+        model = DeepFaceBatchBackend() if batched else DeepFaceBackend()
+    prefetcher = None
+    if case.get("prefetch_threads") and case["workers"] <= 1:
+        prefetcher = Prefetcher(images, case["prefetch_threads"], 16)
+
+    if batched:
+        records = iter_batched_records(images, case["workers"], True, case["batch_size"], prefetcher,
+                                       TimedBackend(model))
+    else:
+        records = iter_records(images, case["workers"], ordered=True, prefetcher=prefetcher,
+                               worker_backend=TimedBackend(model))
+
+    latencies, done, errors = [], [], 0
+    start = time.perf_counter()
+    for record in records:
+        done.append(time.perf_counter())
+        if record["status"] == "ok":
+            latencies.append(record["raw_output"][0].pop("_benchmark_seconds"))
+        else:
+            errors += 1
+        writer.write(record)
+
+    # Pool workers load before their first image; the serial path loads before the first record
+    load_s = done[0] - start - (latencies[0] if latencies else 0)
+    return start, load_s, latencies, done, errors
+
+
+def run_facellm(case, args, images, writer):
+    from facellm_worker import FaceLLMWorker
+    from infer_facellm import INFERENCE_COMMAND, iter_subprocess
+
+    stub_args = ["--load_s", str(args.load_s), "--latency_ms", str(args.latency_ms)]
+    prompt = "Describe the face as JSON."
+
+    start = time.perf_counter()
+    worker, load_s = None, None
+    if case["backend"] == "worker":
+        worker_args = []
+        if args.backend == "stub":
+            worker_args = ["--stub", "--stub_load_s", str(args.load_s), "--stub_latency_ms", str(args.latency_ms)]
+        worker = FaceLLMWorker(max_batch_size=case["batch_size"], prefetch_threads=case.get("prefetch_threads", 0),
+                               worker_args=worker_args)
+        worker.start()
+        load_s = time.perf_counter() - start
+        responses = worker.infer_stream(images, prompt)
+    else:
+        if args.backend == "stub":
+            command = (sys.executable, os.path.join(os.path.dirname(__file__), "stub_backends.py"), *stub_args)
+        else:
+            command = INFERENCE_COMMAND
+        responses = iter_subprocess(images, prompt, command)
+
+    latencies, done, errors = [], [], 0
+    previous = time.perf_counter()
+    try:
+        for img_path, response in responses:
+            now = time.perf_counter()
+            done.append(now)
+            # Worker: request round trip. Subprocess: images are processed one at a time.
+            latencies.append(response.get("seconds", now - previous))
+            previous = now
+            if response["status"] == "ok":
+                record = {"image_path": img_path, "model": "Facellm",
+                          "raw_output": response["raw_output"], "status": "ok"}
+            else:
+                errors += 1
+                record = {"image_path": img_path, "model": "Facellm", "status": "error",
+                          "stderr": response["stderr"]}
+            writer.write(record)
+    finally:
+        if worker is not None:
+            worker.close()
+
+    return start, load_s, latencies, done, errors
+
+
+def run_case(name, args):
+    from jsonl_io import JsonlWriter
+    from manifest import list_images
+
+    case = dict(CASES[name])
+    if case.get("workers", 1) is None:
+        case["workers"] = args.workers
+    if case.get("batch_size", 1) is None:
+        case["batch_size"] = args.batch_size
+
+    images = list_images(args.data)[:args.max_images]
+    run = run_deepface if case["model"] == "deepface" else run_facellm
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with JsonlWriter(os.path.join(tmp, "out.jsonl"), default=str) as writer:
+            start, load_s, latencies, done, errors = run(case, args, images, writer)
+        end = time.perf_counter()
+
+    latencies = np.asarray(latencies) * 1000
+    steady = (len(done) - 1) / (done[-1] - done[0]) if len(done) > 1 and done[-1] > done[0] else None
+    return {
+        "case": name,
+        **case,
+        "images": len(done),
+        "errors": errors,
+        "load_s": load_s,
+        "time_to_first_result_s": done[0] - start if done else None,
+        "wall_s": end - start,
+        "images_per_sec": len(done) / (end - start),
+        "images_per_sec_after_first": steady,
+        "latency_ms": {
+            "mean": float(latencies.mean()),
+            **{f"p{q}": float(np.percentile(latencies, q)) for q in (50, 95, 99)},
+        } if len(latencies) else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Inference wrapper benchmark")
+
+    parser.add_argument("--cases", type=str, nargs="+", default=list(CASES), choices=list(CASES),
+                        help="Cases to run")
+    parser.add_argument("--backend", type=str, default="stub", choices=["stub", "real"],
+                        help="stub: deterministic CPU stand-ins, real: DeepFace / FaceLLM")
+    parser.add_argument("--data", type=str, default=None,
+                        help="Image directory (default: synthetic images)")
+    parser.add_argument("--synthetic", type=int, default=64,
+                        help="Number of synthetic images generated when --data is not given")
+    parser.add_argument("--max_images", type=int, default=None,
+                        help="Limit number of images")
+
+    parser.add_argument("--load_s", type=float, default=1.0,
+                        help="Stub model load time")
+    parser.add_argument("--latency_ms", type=float, default=20,
+                        help="Stub per-image latency")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Processes for deepface_pool")
+    parser.add_argument("--batch_size", type=int, default=4,
+                        help="Batch size for facellm_worker_batched and deepface_batched")
+
+    parser.add_argument("--out", type=str, default=None,
+                        help="Output JSON (default: results/benchmarks/benchmark_<commit>.json)")
+    parser.add_argument("--run_case", type=str, default=None,
+                        help=argparse.SUPPRESS)  # internal: run one case and print its JSON
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case, args)))
+        return
+
+    commit = git_commit()
+    out = args.out or f"results/benchmarks/benchmark_{commit or time.strftime('%Y%m%d-%H%M%S')}.json"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = args.data
+        if data is None:
+            data = tmp
+            write_synthetic_images(tmp, args.synthetic)
+
+        results = []
+        for name in args.cases:
+            cmd = [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--data", data, "--run_case", name]
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"[WARN] {name} failed:\n{proc.stderr[-2000:]}")
+                results.append({"case": name, "error": proc.stderr[-2000:]})
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(result)
+
+            latency = result["latency_ms"] or {}
+            load = f"{result['load_s']:.2f}s" if result["load_s"] is not None else "per image"
+            print(f"[INFO] {name}: {result['images_per_sec']:.1f} img/s, load {load}, "
+                  f"p50/p95/p99 {latency.get('p50', 0):.1f}/{latency.get('p95', 0):.1f}/"
+                  f"{latency.get('p99', 0):.1f} ms, peak RSS {result['peak_rss_mb']['self']:.0f} MB "
+                  f"(+{result['peak_rss_mb']['children']:.0f} MB children)")
+
+    report = {
+        "commit": commit,
+        "time": time.time(),
+        "backend": args.backend,
+        "images": args.data or f"{args.synthetic} synthetic",
+        "settings": {"load_s": args.load_s, "latency_ms": args.latency_ms,
+                     "workers": args.workers, "batch_size": args.batch_size},
+        "cpus": len(os.sched_getaffinity(0)),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Benchmark saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
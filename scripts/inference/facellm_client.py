@@ -0,0 +1,207 @@
+# Asyncio client for FaceLLM served behind an OpenAI-compatible endpoint
+# (vLLM, SGLang, llama.cpp server, ... or stub_server.py for tests).
+# The wrapper only does I/O: up to `concurrency` requests are in flight, each
+# on its own keep-alive HTTP connection, and the server batches them
+# continuously. Timeouts, connection errors, 429 and 5xx answers are retried
+# with exponential backoff. Plain asyncio streams are used, so there is no
+# extra dependency.
+
+import asyncio
+import base64
+import json
+import os
+import queue
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+MAX_BACKOFF = 30.0
+
+MIME_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp"}
+
+
+class ServerError(Exception):
+
+    def __init__(self, message, retryable, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def image_data_url(img_path):
+    mime = MIME_TYPES.get(os.path.splitext(img_path)[1].lower(), "image/jpeg")
+    with open(img_path, "rb") as f:
+        return f"data:{mime};base64,{base64.b64encode(f.read()).decode('ascii')}"
+
+
+def chat_request(model, prompt, data_url, max_tokens):
+    return {
+        "model": model,
+        "messages": [{
+            "role": "user",
+            "content": [
+                {"type": "image_url", "image_url": {"url": data_url}},
+                {"type": "text", "text": prompt},
+            ],
+        }],
+        "max_tokens": max_tokens,
+        "temperature": 0,
+    }
+
+
+class HttpConnection:
+    # One keep-alive HTTP/1.1 connection, reopened when the server closes it
+
+    def __init__(self, host, port, use_ssl=False):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=self.use_ssl or None)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def post(self, path, body, headers):
+        if self.writer is None or self.writer.is_closing():
+            await self.open()
+
+        head = [f"POST {path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                "Content-Type: application/json", f"Content-Length: {len(body)}", "Connection: keep-alive"]
+        head += [f"{k}: {v}" for k, v in headers.items()]
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Server closed the connection")
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while (line := await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while (size := int((await self.reader.readline()).split(b";")[0], 16)) > 0:
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            await self.reader.readline()
+            data = b"".join(chunks)
+        elif "content-length" in response_headers:
+            data = await self.reader.readexactly(int(response_headers["content-length"]))
+        else:
+            data = await self.reader.read()
+            self.close()
+
+        if response_headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, response_headers, data
+
+
+class FaceLLMClient:
+
+    def __init__(self, base_url="http://127.0.0.1:8000/v1", model="Qwen/Qwen2-VL-2B-Instruct",
+                 max_tokens=128, concurrency=16, timeout=120.0, max_retries=5, backoff=1.0, api_key=None):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.use_ssl = url.scheme == "https"
+        self.port = url.port or (443 if self.use_ssl else 80)
+        self.path = url.path.rstrip("/") + "/chat/completions"
+        self.model = model
+        self.max_tokens = max_tokens
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+    async def _request(self, conn, body):
+        try:
+            status, headers, data = await asyncio.wait_for(conn.post(self.path, body, self.headers), self.timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+            conn.close()  # the connection state is unknown after a failure
+            raise ServerError(f"{type(e).__name__}: {e}", retryable=True) from e
+
+        if status != 200:
+            retry_after = headers.get("retry-after")
+            raise ServerError(f"HTTP {status}: {data[:500].decode('utf-8', 'replace')}",
+                              retryable=status in RETRY_STATUSES,
+                              retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        try:
+            return json.loads(data)["choices"][0]["message"]["content"].strip()
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+            raise ServerError(f"Unexpected response: {data[:500].decode('utf-8', 'replace')}",
+                              retryable=False) from e
+
+    async def _infer_one(self, conn, img_path, prompt):
+        t0 = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            # File reads stay off the event loop
+            data_url = await loop.run_in_executor(None, image_data_url, img_path)
+        except OSError as e:
+            return {"status": "error", "stderr": f"{type(e).__name__}: {e}"}
+        body = json.dumps(chat_request(self.model, prompt, data_url, self.max_tokens)).encode("utf-8")
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                raw_output = await self._request(conn, body)
+                return {"status": "ok", "raw_output": raw_output, "seconds": time.perf_counter() - t0,
+                        "timings": {"attempts": attempt + 1}}
+            except ServerError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    return {"status": "error", "stderr": str(e), "seconds": time.perf_counter() - t0,
+                            "timings": {"attempts": attempt + 1}}
+                delay = e.retry_after or min(MAX_BACKOFF, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+                await asyncio.sleep(delay)
+
+    async def _run(self, img_paths, prompt, results):
+        todo = asyncio.Queue(maxsize=2 * self.concurrency)
+
+        async def feed():
+            for img_path in img_paths:
+                await todo.put(img_path)
+            for _ in range(self.concurrency):
+                await todo.put(None)
+
+        async def worker():
+            conn = HttpConnection(self.host, self.port, self.use_ssl)
+            try:
+                while (img_path := await todo.get()) is not None:
+                    results.put((img_path, await self._infer_one(conn, img_path, prompt)))
+            finally:
+                conn.close()
+
+        await asyncio.gather(feed(), *(worker() for _ in range(self.concurrency)))
+
+    def infer_stream(self, img_paths, prompt):
+        # Yields (img_path, response) in completion order, like FaceLLMWorker.infer_stream.
+        # The event loop runs in a background thread; the caller keeps writing records.
+        results = queue.Queue()
+        done = object()
+        failure = []
+
+        def run():
+            try:
+                asyncio.run(self._run(img_paths, prompt, results))
+            except BaseException as e:  # surfaced in the caller's thread
+                failure.append(e)
+            finally:
+                results.put(done)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        while (item := results.get()) is not done:
+            yield item
+        thread.join()
+        if failure:
+            raise failure[0]
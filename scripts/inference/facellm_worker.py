@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+
+# Long-lived FaceLLM worker.
+# The model is loaded once, then requests are streamed through stdin/stdout
+# as JSON lines:
+#   -> {"id": 0, "image_path": "...", "prompt": "..."}
+#   <- {"id": 0, "status": "ok", "raw_output": "...", "timings": {...}}
+#   <- {"id": 0, "status": "error", "stderr": "..."}
+# Timings (seconds) cover the time a request waited for its batch, image
+# decoding and the batch's generate call.
+# Requests sharing the same prompt are grouped into one generate call
+# (up to --max_batch_size images, waiting at most --max_wait_ms for a batch to fill).
+# With --prefetch_threads, images are decoded as soon as their request arrives,
+# while the model is still busy with the previous batch.
+
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from prefetch import load_image
+
+WORKER_SCRIPT = Path(__file__).resolve()
+DEFAULT_MODEL = "Qwen/Qwen2-VL-2B-Instruct"
+
+
+class WorkerError(Exception):
+
+    def __init__(self, stderr):
+        super().__init__(stderr)
+        self.stderr = stderr
+
+
+class FaceLLMModel:
+
+    def __init__(self, model_path, processor_path=None, max_new_tokens=128, device="auto", offline=False):
+        self.model_path = model_path
+        self.processor_path = processor_path or model_path
+        self.max_new_tokens = max_new_tokens
+        self.device = device
+        # Load from the local HuggingFace cache only, without any Hub request
+        self.offline = offline
+        self.processor = None
+        self.model = None
+
+    def load(self):
+        import torch
+        from transformers import AutoProcessor, Qwen2VLForConditionalGeneration
+
+        self.processor = AutoProcessor.from_pretrained(self.processor_path, local_files_only=self.offline)
+        # Decoder-only generation needs left padding for batched prompts
+        self.processor.tokenizer.padding_side = "left"
+        self.model = Qwen2VLForConditionalGeneration.from_pretrained(
+            self.model_path,
+            torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32,
+            device_map=self.device,
+            local_files_only=self.offline
+        )
+        self.model.eval()
+
+    def generate(self, images, prompt):
+        # images: decoded RGB arrays
+        import torch
+
+        messages = [{
+            "role": "user",
+            "content": [{"type": "image"}, {"type": "text", "text": prompt}]
+        }]
+        text = self.processor.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=True
+        )
+        inputs = self.processor(
+            text=[text] * len(images), images=images, padding=True, return_tensors="pt"
+        ).to(self.model.device)
+
+        with torch.inference_mode():
+            output_ids = self.model.generate(
+                **inputs, max_new_tokens=self.max_new_tokens, do_sample=False
+            )
+
+        output_ids = output_ids[:, inputs["input_ids"].shape[1]:]
+        return [o.strip() for o in self.processor.batch_decode(output_ids, skip_special_tokens=True)]
+
+
+# Client side: spawns the worker once and keeps it fed with requests
+class FaceLLMWorker:
+
+    def __init__(self, model_path=DEFAULT_MODEL, processor_path=None, max_new_tokens=128,
+                 max_batch_size=1, max_wait_ms=50, prefetch_threads=0, prefetch_depth=16,
+                 resize=None, offline=False, image_store=None, python=sys.executable, worker_args=()):
+        self.max_batch_size = max_batch_size
+        # Prefetching needs requests queued beyond the batch being generated
+        self.max_in_flight = max_batch_size + (prefetch_depth if prefetch_threads > 0 else max_batch_size)
+        self.cmd = [
+            python, str(WORKER_SCRIPT),
+            "--model_path", model_path,
+            "--max_new_tokens", str(max_new_tokens),
+            "--max_batch_size", str(max_batch_size),
+            "--max_wait_ms", str(max_wait_ms),
+            "--prefetch_threads", str(prefetch_threads)
+        ]
+        if resize:
+            self.cmd += ["--resize", str(resize)]
+        if processor_path:
+            self.cmd += ["--processor_path", processor_path]
+        if offline:
+            self.cmd += ["--offline"]
+        if image_store:
+            self.cmd += ["--image_store", image_store]
+        self.cmd += list(worker_args)
+        self.proc = None
+        self.next_id = 0
+        self.start_timings = None
+
+    def start(self):
+        # Worker logs (TensorFlow / transformers warnings) go straight to our stderr
+        self.proc = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1
+        )
+        t0 = time.perf_counter()
+        try:
+            ready = self._read()
+        except WorkerError:
+            # Crashed before "ready": no dead process left behind for the next start
+            self.close()
+            raise
+        if ready.get("status") != "ready":
+            self.close()
+            raise WorkerError(ready.get("stderr", "FaceLLM worker failed to start"))
+        # Reported with the first response of this worker
+        self.start_timings = {"worker_start": time.perf_counter() - t0, "model_load": ready.get("load_s")}
+
+    def _read(self):
+        line = self.proc.stdout.readline()
+        if not line:
+            code = self.proc.wait()
+            raise WorkerError(f"FaceLLM worker exited with code {code}")
+        return json.loads(line)
+
+    def _send(self, img_path, prompt):
+        request = {"id": self.next_id, "image_path": img_path, "prompt": prompt}
+        self.next_id += 1
+        self.proc.stdin.write(json.dumps(request) + "\n")
+        self.proc.stdin.flush()
+        return request["id"]
+
+    def infer(self, img_path, prompt):
+        for _, response in self.infer_stream([img_path], prompt):
+            if response["status"] != "ok":
+                raise WorkerError(response.get("stderr", ""))
+            return response["raw_output"]
+
+    def infer_stream(self, img_paths, prompt, max_in_flight=None):
+        # Keeps enough requests queued in the worker for it to fill full batches.
+        # Yields (img_path, response) in completion order; response["seconds"]
+        # is the request round trip, batching wait included.
+        max_in_flight = max_in_flight or self.max_in_flight
+        img_paths = iter(img_paths)
+        pending = {}
+        exhausted = False
+
+        while pending or not exhausted:
+            if self.proc is None or self.proc.poll() is not None:
+                try:
+                    self.start()
+                except WorkerError as e:
+                    # No worker for the rest of this pass: fail its images, the
+                    # caller's retry passes try again later
+                    for img_path, _ in pending.values():
+                        yield img_path, {"status": "error", "stderr": e.stderr}
+                    for img_path in img_paths:
+                        yield img_path, {"status": "error", "stderr": e.stderr}
+                    return
+
+            try:
+                while not exhausted and len(pending) < max_in_flight:
+                    img_path = next(img_paths, None)
+                    if img_path is None:
+                        exhausted = True
+                        break
+                    # Pending before it is written: a dead pipe still fails it below
+                    pending[self.next_id] = (img_path, time.perf_counter())
+                    self._send(img_path, prompt)
+
+                if pending:
+                    response = self._read()
+                    img_path, sent = pending.pop(response["id"])
+                    response["seconds"] = time.perf_counter() - sent
+                    if self.start_timings is not None:
+                        response["timings"] = {**response.get("timings", {}), **self.start_timings}
+                        self.start_timings = None
+                    yield img_path, response
+
+            except (BrokenPipeError, WorkerError) as e:
+                # Worker died: fail what it was holding, a fresh one is spawned on the next turn
+                self.kill()
+                for img_path, _ in pending.values():
+                    yield img_path, {"status": "error", "stderr": str(e)}
+                pending = {}
+
+    def kill(self):
+        # Reaps a crashed or half-dead worker so it does not keep its model memory
+        if self.proc is None:
+            return
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        for pipe in (self.proc.stdin, self.proc.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass  # unflushed writes to a dead process
+        self.proc = None
+
+    def close(self):
+        if self.proc is None:
+            return
+        if self.proc.poll() is None:
+            self.proc.stdin.close()
+            try:
+                self.proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.proc = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_requests(stream, requests, pool=None, size=None, load_fn=load_image):
+    for line in stream:
+        if line.strip():
+            request = json.loads(line)
+            request["received"] = time.perf_counter()
+            if pool is not None:
+                request["image"] = pool.submit(load_fn, request["image_path"], size)
+            requests.put(request)
+    requests.put(None)
+
+
+class InputStats:
+
+    def __init__(self, load_fn=load_image):
+        self.load_fn = load_fn
+        self.wait_seconds = 0.0
+        self.count = 0
+        self.started = time.perf_counter()
+
+    def get(self, request, size=None):
+        t0 = time.perf_counter()
+        try:
+            if "image" in request:
+                return request["image"].result()
+            return self.load_fn(request["image_path"], size)
+        finally:
+            request["decode"] = time.perf_counter() - t0
+            self.wait_seconds += request["decode"]
+            self.count += 1
+
+    def summary(self):
+        total = time.perf_counter() - self.started
+        share = 100 * self.wait_seconds / total if total else 0.0
+        return (f"[INFO] Input wait: {self.wait_seconds:.1f}s over {self.count} images "
+                f"({share:.1f}% of {total:.1f}s)")
+
+
+def iter_batches(requests, max_batch_size, max_wait):
+    # Dynamic micro-batching: block for the first request, then collect more
+    # with the same prompt until the batch is full or max_wait has elapsed.
+    # Requests with a different prompt are held back for a later batch.
+    held = []
+    closed = False
+
+    while held or not closed:
+        first = held.pop(0) if held else requests.get()
+        if first is None:
+            closed = True
+            continue
+
+        batch = [first]
+        kept = []
+        for request in held:
+            if len(batch) < max_batch_size and request["prompt"] == first["prompt"]:
+                batch.append(request)
+            else:
+                kept.append(request)
+        held = kept
+
+        deadline = time.monotonic() + max_wait
+        while not closed and len(batch) < max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                closed = True
+            elif request["prompt"] == first["prompt"]:
+                batch.append(request)
+            else:
+                held.append(request)
+
+        yield batch
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("FaceLLM persistent worker")
+
+    parser.add_argument("--model_path", type=str, default=DEFAULT_MODEL,
+                        help="HuggingFace id or local path of the model")
+    parser.add_argument("--processor_path", type=str, default=None,
+                        help="Processor id or path (defaults to --model_path)")
+    parser.add_argument("--max_new_tokens", type=int, default=128,
+                        help="Generation budget per answer")
+    parser.add_argument("--device", type=str, default="auto",
+                        help="device_map passed to from_pretrained")
+    parser.add_argument("--offline", action="store_true",
+                        help="Load the model from the local HuggingFace cache only")
+    parser.add_argument("--max_batch_size", type=int, default=1,
+                        help="Maximum number of images per generate call")
+    parser.add_argument("--max_wait_ms", type=float, default=50,
+                        help="Maximum time to wait for a batch to fill")
+    parser.add_argument("--prefetch_threads", type=int, default=0,
+                        help="Decode images in N background threads (0: decode inline)")
+    parser.add_argument("--resize", type=int, default=None,
+                        help="Resize images to SIZE x SIZE before the processor")
+    parser.add_argument("--image_store", type=str, default=None,
+                        help="Read decoded images from this store instead of the files (see image_store.py)")
+
+    # Deterministic CPU stand-in for the model (benchmarks, see stub_backends.py)
+    parser.add_argument("--stub", action="store_true",
+                        help="Serve a stub model instead of loading --model_path")
+    parser.add_argument("--stub_load_s", type=float, default=1.0,
+                        help="Simulated model load time")
+    parser.add_argument("--stub_latency_ms", type=float, default=50,
+                        help="Simulated generate time per image")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Keep the protocol channel clean: anything printed by libraries goes to stderr
+    channel = os.fdopen(os.dup(1), "w", buffering=1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    def send(message):
+        channel.write(json.dumps(message) + "\n")
+        channel.flush()
+
+    if args.stub:
+        from stub_backends import StubFaceLLM
+        model = StubFaceLLM(args.stub_load_s, args.stub_latency_ms)
+    else:
+        model = FaceLLMModel(args.model_path, args.processor_path, args.max_new_tokens, args.device, args.offline)
+    t0 = time.perf_counter()
+    try:
+        model.load()
+    except Exception:
+        send({"status": "error", "stderr": traceback.format_exc()})
+        return 1
+    send({"status": "ready", "load_s": time.perf_counter() - t0})
+
+    def timings(request, started, generate, batch_size):
+        return {"queue": started - request["received"], "decode": request.get("decode"),
+                "generate": generate, "batch_size": batch_size}
+
+    load_fn = load_image
+    if args.image_store:
+        from image_store import ImageStore
+        load_fn = ImageStore(args.image_store).load
+
+    pool = ThreadPoolExecutor(args.prefetch_threads) if args.prefetch_threads > 0 else None
+    stats = InputStats(load_fn)
+
+    requests = queue.Queue()
+    threading.Thread(
+        target=read_requests, args=(sys.stdin, requests, pool, args.resize, load_fn), daemon=True
+    ).start()
+
+    def generate_batch(batch, images, started):
+        # One generate() call for the batch; if it fails, one call per request
+        # on the images already decoded, so a bad input only fails itself
+        try:
+            t0 = time.perf_counter()
+            outputs = model.generate(images, batch[0]["prompt"])
+            generate = time.perf_counter() - t0
+        except Exception:
+            if len(batch) == 1:
+                send({"id": batch[0]["id"], "status": "error", "stderr": traceback.format_exc()})
+            else:
+                for request, image in zip(batch, images):
+                    generate_batch([request], [image], started)
+            return
+        for request, raw_output in zip(batch, outputs):
+            send({"id": request["id"], "status": "ok", "raw_output": raw_output,
+                  "timings": timings(request, started, generate, len(batch))})
+
+    for batch in iter_batches(requests, args.max_batch_size, args.max_wait_ms / 1000):
+        started = time.perf_counter()
+        decoded = []
+        for request in batch:
+            try:
+                decoded.append((request, stats.get(request, args.resize)))
+            except Exception:
+                # Unreadable image: fails alone, the rest of its batch still runs
+                send({"id": request["id"], "status": "error", "stderr": traceback.format_exc()})
+        if decoded:
+            generate_batch([request for request, _ in decoded], [image for _, image in decoded], started)
+
+    print(stats.summary(), file=sys.stderr)
+    if pool is not None:
+        pool.shutdown()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# Classification of failed inference records, and selection of the images a
+# replay should run again.
+#   transient: infrastructure (Hub / server 5xx, timeouts, lost connections,
+#              crashed worker, GPU out of memory), worth retrying as is
+#   input:     the image itself (missing, unreadable, truncated)
+#   model:     everything else (model errors, unexpected or unparsable answers,
+#              model files missing in offline mode), needs a fix before a retry
+
+import json
+import os
+import re
+
+from jsonl_io import record_key
+
+TRANSIENT = "transient"
+INPUT = "input"
+MODEL = "model"
+CATEGORIES = [TRANSIENT, INPUT, MODEL]
+
+# Checked in this order against the end of the error message (the raised exception)
+PATTERNS = [
+    (INPUT, re.compile(
+        r"FileNotFoundError|No such file|UnidentifiedImageError|cannot identify image file"
+        r"|image file is truncated|DecompressionBombError|Face could not be detected"
+        r"|is not a valid image|Assertion failed\) !_src\.empty\(\)")),
+    (MODEL, re.compile(
+        r"LocalEntryNotFoundError|outgoing traffic has been disabled"
+        r"|RepositoryNotFoundError|GatedRepoError")),
+    (TRANSIENT, re.compile(
+        r"\b(408|429|5\d\d) (Client|Server) Error|HTTP (408|429|5\d\d)\b|Gateway Time-?out"
+        r"|Service Unavailable|Too Many Requests|Timeout|timed out|TimeoutError"
+        r"|ConnectionError|Connection (reset|refused|aborted)|ConnectionRefusedError"
+        r"|ConnectionResetError|BrokenPipeError|RemoteDisconnected|ProtocolError|closed the connection"
+        r"|couldn't connect to|Temporary failure in name resolution|Max retries exceeded|worker exited with code"
+        r"|CUDA out of memory|OutOfMemoryError|CUDA error: (an illegal memory access|unspecified launch failure)",
+        re.IGNORECASE)),
+]
+
+
+def classify(message):
+    # Category of an error message (stderr / traceback / exception text)
+    if not message:
+        return MODEL
+    # Tracebacks end with the exception that was raised; earlier lines are its causes
+    tail = message.strip()[-4000:]
+    for category, pattern in PATTERNS:
+        if pattern.search(tail):
+            return category
+    return MODEL
+
+
+def error_message(record):
+    # FaceLLM records keep "stderr", DeepFace records "error"
+    return record.get("stderr") or record.get("error") or ""
+
+
+def record_category(record):
+    # Older outputs have no "error_type": classify their message
+    return record.get("error_type") or classify(error_message(record))
+
+
+def failed_images(path, categories=(TRANSIENT,)):
+    # {image_path: category} of images whose records in an output JSONL are all
+    # errors, keeping the latest one, restricted to `categories`
+    latest, done = {}, set()
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            key = record_key(line)
+            if key is None:
+                continue
+            img_path, ok = key
+            if ok:
+                done.add(img_path)
+            elif img_path not in done:
+                latest[img_path] = record_category(json.loads(line))
+
+    return {img_path: category for img_path, category in latest.items()
+            if img_path not in done and category in categories}
+
+
+def summary(categories):
+    # categories: iterable of category names, one per failed record
+    counts = {}
+    for category in categories:
+        counts[category] = counts.get(category, 0) + 1
+    return ", ".join(f"{counts[c]} {c}" for c in CATEGORIES if c in counts) or "none"
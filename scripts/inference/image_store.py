@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+# Decoded image store: every image of a dataset decoded once into one
+# fixed-shape uint8 array (N, SIZE, SIZE, 3), RGB, saved as .npy and opened
+# memory-mapped. Inference then reads zero-copy rows from the page cache
+# instead of decoding the JPEGs again on every run, for both models.
+# Images are decoded exactly like prefetch.load_image (PIL, RGB, bilinear
+# resize when not SIZE x SIZE), rows follow the sorted image list.
+#
+# Layout of the store directory:
+#   images.npy  the array
+#   store.json  dataset root, image size, relative image paths (row order) and
+#               images that could not be decoded; written last, so a store
+#               without it is incomplete
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from manifest import list_images
+from prefetch import load_image
+
+ARRAY_FILE = "images.npy"
+META_FILE = "store.json"
+
+
+class ImageStore:
+
+    def __init__(self, root):
+        with open(os.path.join(root, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.data_root = meta["root"]
+        self.size = meta["size"]
+        self.paths = meta["images"]
+        self.failed = meta["failed"]
+        self.array = np.load(os.path.join(root, ARRAY_FILE), mmap_mode="r")
+        self.rows = {rel: row for row, rel in enumerate(self.paths)}
+        self.ids = None
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.paths)
+
+    def row(self, img_path):
+        # Row of an image path (absolute or relative to the working directory), None if not stored
+        return self.rows.get(os.path.relpath(os.path.abspath(img_path), self.data_root))
+
+    def load(self, img_path, size=None):
+        # Drop-in for prefetch.load_image: a read-only view into the mapped array.
+        # Images missing from the store are decoded from their file, and so are
+        # those that failed to decode, to raise the same error as without a store.
+        row = self.row(img_path)
+        if row is None or self.paths[row] in self.failed:
+            self.misses += 1
+            return load_image(img_path, size)
+
+        img = self.array[row]
+        if size is not None and size != self.size:
+            from PIL import Image
+
+            img = np.asarray(Image.fromarray(img).resize((size, size), Image.BILINEAR))
+        return img
+
+    def batch(self, img_paths):
+        # (n, SIZE, SIZE, 3) array of stored images: a view when the rows are
+        # consecutive (sorted image lists, shards aside), a gathered copy otherwise
+        rows = [self.row(img_path) for img_path in img_paths]
+        if None in rows:
+            raise KeyError(f"{img_paths[rows.index(None)]} is not in the store")
+        if rows == list(range(rows[0], rows[0] + len(rows))):
+            return self.array[rows[0]:rows[0] + len(rows)]
+        return self.array[rows]
+
+    def rows_for_ids(self, image_ids):
+        # image_id = file name stem, as in the normalized CSVs. FairFace reuses
+        # ids across train/ and val/, so an ambiguous id is an error.
+        if self.ids is None:
+            self.ids = {}
+            for row, rel in enumerate(self.paths):
+                stem = os.path.splitext(os.path.basename(rel))[0]
+                if stem.isdigit():
+                    self.ids.setdefault(int(stem), []).append(row)
+        rows = []
+        for image_id in image_ids:
+            found = self.ids.get(int(image_id), [])
+            if len(found) != 1:
+                raise KeyError(f"image_id {image_id} matches {len(found)} stored images")
+            rows.append(found[0])
+        return np.asarray(rows, dtype=np.int64)
+
+    def by_ids(self, image_ids):
+        return self.array[self.rows_for_ids(image_ids)]
+
+
+def build_store(data_dir, out_dir, size=224, manifest_path=None, threads=8):
+    images = list_images(data_dir, manifest_path)
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # incomplete until rewritten
+
+    array = np.lib.format.open_memmap(os.path.join(out_dir, ARRAY_FILE), mode="w+",
+                                      dtype=np.uint8, shape=(len(images), size, size, 3))
+
+    def decode(row):
+        try:
+            array[row] = load_image(images[row], size)
+            return None
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+
+    root = os.path.abspath(data_dir)
+    failed = {}
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for row, error in enumerate(pool.map(decode, range(len(images)))):
+            if error is not None:
+                failed[os.path.relpath(os.path.abspath(images[row]), root)] = error
+    array.flush()
+    del array
+
+    meta = {
+        "root": root,
+        "size": size,
+        "created": time.time(),
+        "images": [os.path.relpath(os.path.abspath(img_path), root) for img_path in images],
+        "failed": failed,
+    }
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return len(images), failed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Decode a dataset once into a memory-mapped image store")
+
+    parser.add_argument("--data", type=str, required=True,
+                        help="Image directory")
+    parser.add_argument("--out", type=str, required=True,
+                        help="Store directory")
+    parser.add_argument("--size", type=int, default=224,
+                        help="Images are stored as SIZE x SIZE (FairFace crops are 224 x 224)")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Read the image list from this manifest (see manifest.py)")
+    parser.add_argument("--threads", type=int, default=8,
+                        help="Decoding threads")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    t0 = time.perf_counter()
+    n, failed = build_store(args.data, args.out, args.size, args.manifest, args.threads)
+    gb = n * args.size * args.size * 3 / 1e9
+    print(f"[INFO] {n} images decoded to {args.out} ({gb:.2f} GB) in {time.perf_counter() - t0:.1f}s")
+    if failed:
+        print(f"[INFO] Could not decode {len(failed)} images (recorded as failed in {META_FILE})")
+
+
+if __name__ == "__main__":
+    main()
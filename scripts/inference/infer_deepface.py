@@ -1,20 +1,334 @@
 #!/usr/bin/env python3
 
 import argparse
-import json
+import multiprocessing as mp
 import os
-from pathlib import Path
+import time
+from functools import partial
+from itertools import chain, islice
+
+import numpy as np
 from tqdm import tqdm
 
-from deepface import DeepFace
+from image_store import ImageStore
+from failures import CATEGORIES, TRANSIENT, classify, failed_images, summary
+from jsonl_io import JsonlWriter, completed_images, with_timings, write_run_timings
+from manifest import list_images, read_image_list
+from prefetch import Prefetcher, load_image
+from result_cache import ResultCache
+from sharding import shard_images, shard_output_path
+
+
+def set_tf_threads(threads):
+    import tensorflow as tf
+
+    if threads:
+        # Share the allocated cores between workers instead of each one grabbing all of them
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def build_attribute_model(name):
+    # Keras model behind one of DeepFace's facial attribute clients
+    from deepface import DeepFace
+
+    try:
+        client = DeepFace.build_model(model_name=name, task="facial_attribute")
+    except TypeError:  # deepface < 0.0.90 has no task argument
+        client = DeepFace.build_model(name)
+    return getattr(client, "model", client)
+
+
+class DeepFaceBackend:
+    # The real model. Other backends (see stub_backends.py) provide the same
+    # load() / analyze() pair and must be picklable for the process pool.
+
+    actions = ["age", "gender", "race"]
+
+    def load(self, threads=None):
+        from deepface import DeepFace
+
+        set_tf_threads(threads)
+
+        # Build the age / gender / race models once per process, before the first real image
+        DeepFace.analyze(
+            img_path=np.zeros((224, 224, 3), dtype=np.uint8),
+            actions=self.actions,
+            enforce_detection=False,
+            silent=True
+        )
+
+    def analyze(self, img):
+        from deepface import DeepFace
+
+        return DeepFace.analyze(img_path=img, actions=self.actions, enforce_detection=False)
+
+
+class DeepFaceBatchBackend:
+    # Pre-cropped faces (FairFace margin025): no face detection, the age, gender
+    # and race models each run once per stacked batch. Outputs match
+    # DeepFace.analyze(detector_backend="skip"): the region is the whole image
+    # and face_confidence is 0, as when analyze() falls back to the full frame.
+    # analyze_batch() takes decoded RGB arrays and returns one raw_output per image.
+
+    input_size = 224
+    gender_labels = ["Woman", "Man"]
+    race_labels = ["asian", "indian", "black", "white", "middle eastern", "latino hispanic"]
+
+    def __init__(self):
+        self.models = None
+
+    def load(self, threads=None):
+        set_tf_threads(threads)
+        self.models = {action: build_attribute_model(name)
+                       for action, name in [("age", "Age"), ("gender", "Gender"), ("race", "Race")]}
+        # First call builds the TensorFlow graphs
+        self.analyze_batch([np.zeros((self.input_size, self.input_size, 3), dtype=np.uint8)])
+
+    def model_input(self, img):
+        # RGB uint8 -> BGR float in [0, 1], letterboxed to input_size like deepface's resize_image
+        size = self.input_size
+        img = img[:, :, ::-1].astype(np.float32) / 255
+        if img.shape[:2] != (size, size):
+            import cv2
+
+            factor = min(size / img.shape[0], size / img.shape[1])
+            img = cv2.resize(img, (int(img.shape[1] * factor), int(img.shape[0] * factor)))
+            dh, dw = size - img.shape[0], size - img.shape[1]
+            img = np.pad(img, ((dh // 2, dh - dh // 2), (dw // 2, dw - dw // 2), (0, 0)))
+            if img.shape[:2] != (size, size):
+                img = cv2.resize(img, (size, size))
+        return img
+
+    def analyze_batch(self, imgs):
+        batch = np.stack([self.model_input(img) for img in imgs])
+        age = np.asarray(self.models["age"].predict_on_batch(batch))
+        gender = 100 * np.asarray(self.models["gender"].predict_on_batch(batch))
+        race = np.asarray(self.models["race"].predict_on_batch(batch))
+        race = 100 * race / race.sum(axis=1, keepdims=True)
+        # Apparent age: expectation over the 0..100 age classes
+        ages = age @ np.arange(age.shape[1], dtype=age.dtype)
+
+        outputs = []
+        for i, img in enumerate(imgs):
+            outputs.append([{
+                "age": int(ages[i]),
+                "region": {"x": 0, "y": 0, "w": img.shape[1] - 1, "h": img.shape[0] - 1,
+                           "left_eye": None, "right_eye": None},
+                "face_confidence": 0.0,
+                "gender": dict(zip(self.gender_labels, gender[i])),
+                "dominant_gender": self.gender_labels[int(gender[i].argmax())],
+                "race": dict(zip(self.race_labels, race[i])),
+                "dominant_race": self.race_labels[int(race[i].argmax())],
+            }])
+        return outputs
+
+
+# Backend of this process (set per pool worker by init_worker)
+backend = DeepFaceBackend()
+# Model load time of this process, reported once in the timings of its first record
+load_seconds = None
+# Decoded images of this process (--image_store), read instead of the image files
+image_store = None
+
+
+def ok_record(img_path, result):
+    return {
+        "image_path": img_path,
+        "model": "DeepFace",
+        "raw_output": result,
+        "status": "ok"
+    }
+
+
+def error_record(img_path, e):
+    return {
+        "image_path": img_path,
+        "model": "DeepFace",
+        "status": "error",
+        "error_type": classify(f"{type(e).__name__}: {e}"),
+        "error": str(e)
+    }
+
+
+def startup_timings(stages):
+    # Model load time goes with the first record of each process
+    global load_seconds
+    if load_seconds is not None:
+        stages["model_load"], load_seconds = load_seconds, None
+    return stages
 
 
-def list_images(data_dir):
-    images = []
-    for root, _, files in os.walk(data_dir):
-        for f in files:
-            images.append(os.path.join(root, f))
-    return sorted(images)
+def analyze_image(img_path, img=None, timings=False):
+    t0 = time.perf_counter()
+    try:
+        if isinstance(img, Exception):
+            raise img
+        if img is None and image_store is not None:
+            img = image_store.load(img_path)
+
+        # DeepFace expects BGR arrays, as returned by cv2.imread
+        result = backend.analyze(img_path if img is None else np.ascontiguousarray(img[:, :, ::-1]))
+        record = ok_record(img_path, result)
+
+    except Exception as e:
+        record = error_record(img_path, e)
+
+    if timings:
+        # Without prefetching, "analyze" includes reading and decoding the file
+        record = with_timings(record, startup_timings({"analyze": time.perf_counter() - t0}))
+
+    return record
+
+
+def load_or_error(img_path):
+    try:
+        if image_store is not None:
+            return image_store.load(img_path)
+        return load_image(img_path)
+    except Exception as e:
+        return e
+
+
+def analyze_batch(img_paths, imgs=None, timings=False):
+    # Batched backend: imgs are decoded RGB arrays (or the exception raised
+    # while decoding), loaded here when not prefetched
+    t0 = time.perf_counter()
+    prefetched = imgs is not None
+    if not prefetched:
+        imgs = [load_or_error(img_path) for img_path in img_paths]
+    decoded = time.perf_counter()
+
+    results = {i: img for i, img in enumerate(imgs) if isinstance(img, Exception)}
+    valid = [i for i in range(len(imgs)) if i not in results]
+    try:
+        results.update(zip(valid, backend.analyze_batch([imgs[i] for i in valid])))
+    except Exception:
+        # One bad image must not fail its whole batch: retry one by one
+        for i in valid:
+            try:
+                results[i] = backend.analyze_batch([imgs[i]])[0]
+            except Exception as e:
+                results[i] = e
+    analyzed = time.perf_counter()
+
+    records = []
+    for i, img_path in enumerate(img_paths):
+        result = results[i]
+        record = error_record(img_path, result) if isinstance(result, Exception) else ok_record(img_path, result)
+        if timings:
+            # "analyze" is the batch's model time (like FaceLLM's "generate"), decoding a per-image share
+            stages = {"analyze": analyzed - decoded, "batch_size": len(img_paths)}
+            if not prefetched:
+                stages["decode"] = (decoded - t0) / len(img_paths)
+            record = with_timings(record, startup_timings(stages) if i == 0 else stages)
+        records.append(record)
+    return records
+
+
+def model_version():
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        deepface_version = version("deepface")
+    except PackageNotFoundError:
+        deepface_version = "unknown"
+    # Anything that changes analyze() outputs belongs here
+    return f"deepface={deepface_version};actions=age,gender,race;enforce_detection=False"
+
+
+def init_worker(threads, worker_backend=None, store_dir=None):
+    global backend, load_seconds, image_store
+    if worker_backend is not None:
+        backend = worker_backend
+    if store_dir is not None:
+        image_store = ImageStore(store_dir)
+    t0 = time.perf_counter()
+    backend.load(threads)
+    load_seconds = time.perf_counter() - t0
+
+
+def iter_records(images, workers, ordered, prefetcher=None, worker_backend=None, timings=False,
+                 store_dir=None):
+    if not images:
+        return  # e.g. every image was a cache hit: no model load, no pool
+    if workers <= 1:
+        init_worker(None, worker_backend, store_dir)
+        if prefetcher is None:
+            for img_path in images:
+                yield analyze_image(img_path, timings=timings)
+        else:
+            prefetched = iter(prefetcher)
+            while True:
+                t0 = time.perf_counter()
+                item = next(prefetched, None)
+                if item is None:
+                    break
+                wait = time.perf_counter() - t0
+                img_path, img, error = item
+                record = analyze_image(img_path, error or img, timings)
+                if timings:
+                    record["timings"]["input_wait"] = wait
+                yield record
+        return
+
+    # spawn rather than fork: TensorFlow state does not survive a fork
+    ctx = mp.get_context("spawn")
+    threads = max(1, len(os.sched_getaffinity(0)) // workers)
+    with ctx.Pool(processes=workers, initializer=init_worker, initargs=(threads, worker_backend, store_dir)) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        yield from imap(partial(analyze_image, timings=timings), images, chunksize=4)
+
+
+def iter_batched_records(images, workers, ordered, batch_size, prefetcher=None, worker_backend=None,
+                         timings=False, store_dir=None):
+    # Same as iter_records, one backend.analyze_batch() call per batch_size images
+    if not images:
+        return
+    if workers <= 1:
+        init_worker(None, worker_backend, store_dir)
+        if prefetcher is None:
+            for start in range(0, len(images), batch_size):
+                yield from analyze_batch(images[start:start + batch_size], timings=timings)
+        else:
+            prefetched = iter(prefetcher)
+            while True:
+                t0 = time.perf_counter()
+                items = list(islice(prefetched, batch_size))
+                if not items:
+                    break
+                wait = (time.perf_counter() - t0) / len(items)
+                records = analyze_batch([img_path for img_path, _, _ in items],
+                                        [error or img for _, img, error in items], timings)
+                for record in records:
+                    if timings:
+                        record["timings"]["input_wait"] = wait
+                    yield record
+        return
+
+    batches = [images[start:start + batch_size] for start in range(0, len(images), batch_size)]
+    ctx = mp.get_context("spawn")
+    threads = max(1, len(os.sched_getaffinity(0)) // workers)
+    with ctx.Pool(processes=workers, initializer=init_worker, initargs=(threads, worker_backend, store_dir)) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for records in imap(partial(analyze_batch, timings=timings), batches):
+            yield from records
+
+
+def with_cached(records, order, hits):
+    # Cached results at their place in `order` among the computed records,
+    # which follow the same order (--unordered aside)
+    order = iter(order)
+    for record in records:
+        for img_path in order:
+            if img_path == record["image_path"]:
+                break
+            if img_path in hits:
+                yield ok_record(img_path, hits[img_path])
+        yield record
+    for img_path in order:
+        if img_path in hits:
+            yield ok_record(img_path, hits[img_path])
 
 
 def parse_args():
@@ -25,10 +339,55 @@ def parse_args():
     parser.add_argument("--out", type=str, required=True,
                         help="Output JSONL file")
 
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Read the image list from this manifest (built on first use, see manifest.py)")
+    parser.add_argument("--image_list", type=str, default=None,
+                        help="Process the images listed in this file (one path per line), in its order")
     parser.add_argument("--max_images", type=int, default=None,
                         help="Limit number of images")
     parser.add_argument("--start_index", type=int, default=0,
                         help="Resume from index")
+    parser.add_argument("--shard_index", type=int, default=0,
+                        help="Shard processed by this job (e.g. $SLURM_ARRAY_TASK_ID)")
+    parser.add_argument("--num_shards", type=int, default=1,
+                        help="Total number of shards; each shard writes its own --out file")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip images already marked ok in --out (errored ones are retried)")
+    parser.add_argument("--replay", action="store_true",
+                        help="Only run the images whose records in --out are failures of --retry_categories")
+    parser.add_argument("--retry_categories", type=str, nargs="+", default=[TRANSIENT], choices=CATEGORIES,
+                        help="Failures replayed (see failures.py)")
+    parser.add_argument("--flush_every", type=int, default=64,
+                        help="Write buffered records every N records")
+    parser.add_argument("--flush_interval", type=float, default=10.0,
+                        help="... or every N seconds, whichever comes first")
+    parser.add_argument("--fsync", action="store_true",
+                        help="fsync the output on every flush")
+
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of inference processes (models loaded once per process)")
+    parser.add_argument("--skip_detection", action="store_true",
+                        help="Images are face crops: skip detection and run the attribute models on "
+                             "stacked batches (region = whole image, face_confidence = 0)")
+    parser.add_argument("--batch_size", type=int, default=32,
+                        help="Images per model call with --skip_detection")
+    parser.add_argument("--unordered", action="store_true",
+                        help="Write records as they complete instead of in image order")
+    parser.add_argument("--prefetch_threads", type=int, default=0,
+                        help="Decode images in N background threads (0: DeepFace reads the files itself)")
+    parser.add_argument("--prefetch_depth", type=int, default=16,
+                        help="Maximum number of decoded images waiting for the model")
+    parser.add_argument("--resize", type=int, default=None,
+                        help="Resize prefetched images to SIZE x SIZE")
+    parser.add_argument("--image_store", type=str, default=None,
+                        help="Read decoded images from this store instead of the files (see image_store.py)")
+    parser.add_argument("--timings", action="store_true",
+                        help="Add per-stage timings to every record (see timing_report.py)")
+
+    parser.add_argument("--cache_dir", type=str, default=None,
+                        help="Reuse results cached by image content, model and prompt (off by default)")
+    parser.add_argument("--cache_max_gb", type=float, default=10.0,
+                        help="Least recently used cache entries are evicted above this size")
 
     return parser.parse_args()
 
@@ -36,45 +395,81 @@ def parse_args():
 def main():
     args = parse_args()
 
-    images = list_images(args.data)
+    if args.image_list:
+        images = read_image_list(args.image_list)
+    else:
+        images = list_images(args.data, args.manifest)
+    images = shard_images(images, args.shard_index, args.num_shards)
+    out_path = shard_output_path(args.out, args.shard_index, args.num_shards)
 
     if args.max_images is not None:
         images = images[:args.max_images]
 
     images = images[args.start_index:]
 
+    if args.replay:
+        failed = failed_images(out_path, args.retry_categories)
+        images = [img_path for img_path in images if img_path in failed]
+        print(f"[INFO] Failures replayed: {summary(failed[img_path] for img_path in images)}")
+    elif args.resume:
+        done = completed_images(out_path)
+        images = [img_path for img_path in images if img_path not in done]
+        print(f"[INFO] Already completed: {len(done)}")
+
+    cache, keys, hits = None, {}, {}
+    if args.cache_dir:
+        # Resized inputs give different outputs, so they get their own namespace
+        version = model_version() + (f";resize={args.resize}" if args.resize else "")
+        if args.skip_detection:
+            version += ";detector=skip"
+        cache = ResultCache(args.cache_dir, int(args.cache_max_gb * 1e9), "DeepFace", version,
+                            default=str)
+        keys, hits = cache.lookup(images)
+        order = images
+        images = [img_path for img_path in images if img_path not in hits]
+        print(f"[INFO] Cached results reused: {len(hits)}")
+
+    if args.num_shards > 1:
+        print(f"[INFO] Shard {args.shard_index}/{args.num_shards} -> {out_path}")
     print(f"[INFO] Images to process: {len(images)}")
 
-    out_path = Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    with open(out_path, "a") as fout:
-        for img_path in tqdm(images):
-            try:
-                result = DeepFace.analyze(
-                    img_path=img_path,
-                    actions=["age", "gender", "race"],
-                    enforce_detection=False
-                )
-
-                record = {
-                    "image_path": img_path,
-                    "model": "DeepFace",
-                    "raw_output": result,
-                    "status": "ok"
-                }
+    # Workers only analyze; this process is the single writer
+    # Pool workers decode in parallel on their own, prefetching only helps the serial path
+    prefetcher = None
+    if args.prefetch_threads > 0 and args.workers <= 1:
+        load_fn = ImageStore(args.image_store).load if args.image_store else load_image
+        prefetcher = Prefetcher(images, args.prefetch_threads, args.prefetch_depth, args.resize, load_fn)
 
-            except Exception as e:
-                record = {
-                    "image_path": img_path,
-                    "model": "DeepFace",
-                    "status": "error",
-                    "error": str(e)
-                }
+    if args.skip_detection:
+        records = iter_batched_records(images, args.workers, not args.unordered, args.batch_size, prefetcher,
+                                       DeepFaceBatchBackend(), args.timings, args.image_store)
+    else:
+        records = iter_records(images, args.workers, ordered=not args.unordered, prefetcher=prefetcher,
+                               timings=args.timings, store_dir=args.image_store)
+    if hits:
+        if args.unordered:
+            records = chain((ok_record(img_path, raw_output) for img_path, raw_output in hits.items()), records)
+        else:
+            records = with_cached(records, order, hits)
+    started = time.perf_counter()
 
-            fout.write(json.dumps(record, default=str) + "\n")
-            fout.flush()  # CRUCIAL on FRIDA
+    writer = JsonlWriter(out_path, args.flush_every, args.flush_interval, args.fsync, default=str)
+    with writer:
+        for record in tqdm(records, total=len(images) + len(hits)):
+            writer.write(record)
+            key = keys.get(record["image_path"])
+            if key is not None and record["status"] == "ok" and record["image_path"] not in hits:
+                cache.put(key, record["raw_output"])
 
+    if args.timings:
+        write_run_timings(out_path, {"wall": time.perf_counter() - started, "write": writer.write_seconds,
+                                     "records": writer.written, "workers": args.workers})
+    if prefetcher is not None:
+        print(prefetcher.summary())
+    if cache is not None:
+        print(cache.summary())
     print("[INFO] DeepFace inference completed.")
 
 
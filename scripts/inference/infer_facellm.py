@@ -1,19 +1,99 @@
 #!/usr/bin/env python3
 
 import argparse
-import json
 import os
 import subprocess
+import sys
+import time
 from pathlib import Path
 from tqdm import tqdm
 
+from failures import CATEGORIES, TRANSIENT, classify, failed_images, summary
+from jsonl_io import JsonlWriter, completed_images, with_timings, write_run_timings
+from manifest import list_images, read_image_list
+from result_cache import ResultCache
+from sharding import shard_images, shard_output_path
 
-def list_images(data_dir):
-    images = []
-    for root, _, files in os.walk(data_dir):
-        for f in files:
-            images.append(os.path.join(root, f))
-    return sorted(images)
+from facellm_client import FaceLLMClient
+from facellm_worker import DEFAULT_MODEL, FaceLLMWorker, WorkerError
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.raw_outputs import parse_facellm_json  # noqa: E402
+
+
+# One process per image running the FaceLLM inference.py script
+INFERENCE_COMMAND = ("python3", "inference.py")
+
+
+def run_inference_subprocess(img_path, prompt, command=INFERENCE_COMMAND):
+    cmd = [
+        *command,
+        "--path_image", img_path,
+        "--prompt", prompt
+    ]
+
+    result = subprocess.run(
+        cmd,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    return result.stdout.strip()
+
+
+def iter_subprocess(images, prompt, command=INFERENCE_COMMAND):
+    # "subprocess" covers process spawn, model load and generation together
+    for img_path in images:
+        t0 = time.perf_counter()
+        try:
+            response = {"status": "ok", "raw_output": run_inference_subprocess(img_path, prompt, command)}
+        except subprocess.CalledProcessError as e:
+            response = {"status": "error", "stderr": e.stderr}
+        response["timings"] = {"subprocess": time.perf_counter() - t0}
+        yield img_path, response
+
+
+def iter_worker(worker, images, prompt):
+    # A worker that cannot start (e.g. the Hub is unreachable while loading the
+    # model) fails the images of this pass instead of the whole run
+    if not images:
+        return  # e.g. every image was a cache hit: no model load
+    if worker.proc is None:
+        try:
+            worker.start()
+        except WorkerError as e:
+            for img_path in images:
+                yield img_path, {"status": "error", "stderr": e.stderr}
+            return
+    yield from worker.infer_stream(images, prompt)
+
+
+def check_local_model(model_path):
+    # Offline mode: fail once here rather than on every image
+    if os.path.isdir(model_path):
+        return
+    try:
+        from huggingface_hub import snapshot_download
+        from huggingface_hub.errors import LocalEntryNotFoundError
+    except ImportError:
+        return
+    try:
+        path = snapshot_download(model_path, local_files_only=True)
+    except LocalEntryNotFoundError:
+        raise SystemExit(f"{model_path} is not in the local HuggingFace cache: "
+                         f"run `huggingface-cli download {model_path}` once with network access")
+    print(f"[INFO] Offline: {model_path} loaded from {path}")
+
+
+def parse_seconds(raw_output):
+    # Time needed to parse the answer the way the normalization scripts do
+    t0 = time.perf_counter()
+    try:
+        parse_facellm_json(raw_output)
+    except ValueError:
+        pass
+    return time.perf_counter() - t0
 
 
 def parse_args():
@@ -26,70 +106,231 @@ def parse_args():
     parser.add_argument("--out", type=str, required=True,
                         help="Output JSONL file")
 
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Read the image list from this manifest (built on first use, see manifest.py)")
+    parser.add_argument("--image_list", type=str, default=None,
+                        help="Process the images listed in this file (one path per line), in its order")
     parser.add_argument("--max_images", type=int, default=None,
                         help="Limit number of images")
     parser.add_argument("--start_index", type=int, default=0,
                         help="Resume from index")
+    parser.add_argument("--shard_index", type=int, default=0,
+                        help="Shard processed by this job (e.g. $SLURM_ARRAY_TASK_ID)")
+    parser.add_argument("--num_shards", type=int, default=1,
+                        help="Total number of shards; each shard writes its own --out file")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip images already marked ok in --out (errored ones are retried)")
+    parser.add_argument("--replay", action="store_true",
+                        help="Only run the images whose records in --out are failures of --retry_categories")
+    parser.add_argument("--retry_categories", type=str, nargs="+", default=[TRANSIENT], choices=CATEGORIES,
+                        help="Failures replayed / retried (see failures.py)")
+    parser.add_argument("--retry_rounds", type=int, default=3,
+                        help="Passes over the failures of --retry_categories left after the main pass")
+    parser.add_argument("--retry_backoff", type=float, default=30,
+                        help="Seconds before the first retry pass, doubled for every following one")
+    parser.add_argument("--flush_every", type=int, default=64,
+                        help="Write buffered records every N records")
+    parser.add_argument("--flush_interval", type=float, default=10.0,
+                        help="... or every N seconds, whichever comes first")
+    parser.add_argument("--fsync", action="store_true",
+                        help="fsync the output on every flush")
+    parser.add_argument("--timings", action="store_true",
+                        help="Add per-stage timings to every record (see timing_report.py)")
+
+    parser.add_argument("--backend", type=str, default="subprocess",
+                        choices=["subprocess", "worker", "server"],
+                        help="subprocess: one inference.py call per image, "
+                             "worker: persistent process, model loaded once, "
+                             "server: requests to an OpenAI-compatible endpoint (--server_url)")
+    parser.add_argument("--model_path", type=str, default=DEFAULT_MODEL,
+                        help="Model loaded by the worker backend / requested from the server")
+    parser.add_argument("--processor_path", type=str, default=None,
+                        help="Processor loaded by the worker backend (defaults to --model_path)")
+    parser.add_argument("--offline", action="store_true",
+                        help="Load the model from the local HuggingFace cache only (HF_HUB_OFFLINE), "
+                             "no Hub request per model load")
+    parser.add_argument("--max_new_tokens", type=int, default=128,
+                        help="Generation budget per answer (worker backend)")
+    parser.add_argument("--batch_size", type=int, default=1,
+                        help="Maximum images per generate call (worker backend)")
+    parser.add_argument("--max_wait_ms", type=float, default=50,
+                        help="Maximum time the worker waits to fill a batch")
+    parser.add_argument("--prefetch_threads", type=int, default=0,
+                        help="Worker decodes images in N background threads (0: decode inline)")
+    parser.add_argument("--prefetch_depth", type=int, default=16,
+                        help="Images queued in the worker beyond the batch being generated")
+    parser.add_argument("--resize", type=int, default=None,
+                        help="Resize images to SIZE x SIZE before the processor")
+    parser.add_argument("--image_store", type=str, default=None,
+                        help="Worker reads decoded images from this store instead of the files (see image_store.py)")
+
+    parser.add_argument("--server_url", type=str, default="http://127.0.0.1:8000/v1",
+                        help="Base URL of the OpenAI-compatible server (server backend)")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Requests in flight, one keep-alive connection each (server backend)")
+    parser.add_argument("--request_timeout", type=float, default=120,
+                        help="Seconds before a request is abandoned and retried")
+    parser.add_argument("--max_retries", type=int, default=5,
+                        help="Retries on timeouts, connection errors, 429 and 5xx")
+    parser.add_argument("--api_key", type=str, default=os.environ.get("OPENAI_API_KEY"),
+                        help="Bearer token sent to the server (default: $OPENAI_API_KEY)")
+
+    parser.add_argument("--cache_dir", type=str, default=None,
+                        help="Reuse results cached by image content, model and prompt (off by default)")
+    parser.add_argument("--cache_max_gb", type=float, default=10.0,
+                        help="Least recently used cache entries are evicted above this size")
+    parser.add_argument("--model_version", type=str, default="",
+                        help="Extra cache namespace, e.g. the inference.py revision (subprocess backend)")
 
     return parser.parse_args()
 
 
+def iter_responses(images, prompt, args, worker=None):
+    if not images:
+        return iter(())
+    if args.backend == "worker":
+        return iter_worker(worker, images, prompt)
+    if args.backend == "server":
+        client = FaceLLMClient(args.server_url, args.model_path, args.max_new_tokens, args.concurrency,
+                               args.request_timeout, args.max_retries, api_key=args.api_key)
+        return client.infer_stream(images, prompt)
+    return iter_subprocess(images, prompt)
+
+
+def write_responses(writer, responses, total, args, cache, keys):
+    # One record per response; returns {image_path: category} of the failures
+    failures = {}
+    for img_path, response in tqdm(responses, total=total):
+        if response["status"] == "ok":
+            record = {
+                "image_path": img_path,
+                "model": "Facellm",
+                "raw_output": response["raw_output"],
+                "status": "ok"
+            }
+            if keys.get(img_path) is not None:
+                cache.put(keys[img_path], response["raw_output"])
+        else:
+            failures[img_path] = classify(response["stderr"])
+            record = {
+                "image_path": img_path,
+                "model": "Facellm",
+                "status": "error",
+                "error_type": failures[img_path],
+                "stderr": response["stderr"]
+            }
+
+        if args.timings:
+            timings = dict(response.get("timings", {}))
+            if "seconds" in response:
+                timings["round_trip"] = response["seconds"]
+            if response["status"] == "ok":
+                timings["parse"] = parse_seconds(response["raw_output"])
+            record = with_timings(record, timings)
+
+        writer.write(record)
+    return failures
+
+
 def main():
     args = parse_args()
 
-    images = list_images(args.data)
+    if args.image_list:
+        images = read_image_list(args.image_list)
+    else:
+        images = list_images(args.data, args.manifest)
+    images = shard_images(images, args.shard_index, args.num_shards)
+    out_path = shard_output_path(args.out, args.shard_index, args.num_shards)
 
     if args.max_images is not None:
         images = images[:args.max_images]
 
     images = images[args.start_index:]
 
-    print(f"[INFO] Images to process: {len(images)}")
+    if args.replay:
+        failed = failed_images(out_path, args.retry_categories)
+        images = [img_path for img_path in images if img_path in failed]
+        print(f"[INFO] Failures replayed: {summary(failed[img_path] for img_path in images)}")
+    elif args.resume:
+        done = completed_images(out_path)
+        images = [img_path for img_path in images if img_path not in done]
+        print(f"[INFO] Already completed: {len(done)}")
 
     with open(args.prompt_file, "r") as f:
         prompt = f.read().strip()
 
-    out_path = Path(args.out)
+    if args.offline and args.backend != "server":
+        # Inherited by the worker / inference.py processes
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+        check_local_model(args.model_path)
+
+    cache, keys, hits = None, {}, {}
+    if args.cache_dir:
+        if args.backend == "worker":
+            model_id = args.model_path
+            version = (f"{args.model_version};processor={args.processor_path};"
+                       f"max_new_tokens={args.max_new_tokens};resize={args.resize}")
+        elif args.backend == "server":
+            model_id = args.model_path
+            version = f"{args.model_version};server;max_new_tokens={args.max_new_tokens}"
+        else:
+            model_id, version = "inference.py", args.model_version
+        cache = ResultCache(args.cache_dir, int(args.cache_max_gb * 1e9), model_id, version, prompt)
+        keys, hits = cache.lookup(images)
+        images = [img_path for img_path in images if img_path not in hits]
+        print(f"[INFO] Cached results reused: {len(hits)}")
+
+    if args.num_shards > 1:
+        print(f"[INFO] Shard {args.shard_index}/{args.num_shards} -> {out_path}")
+    print(f"[INFO] Images to process: {len(images)}")
+
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    with open(out_path, "a") as fout:
-        for img_path in tqdm(images):
-
-            cmd = [
-                "python3",
-                "inference.py",
-                "--path_image", img_path,
-                "--prompt", prompt
-            ]
-
-            try:
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
-
-                raw_output = result.stdout.strip()
-
-                record = {
-                    "image_path": img_path,
-                    "model": "Facellm",
-                    "raw_output": raw_output,
-                    "status": "ok"
-                }
-
-            except subprocess.CalledProcessError as e:
-                record = {
-                    "image_path": img_path,
-                    "model": "Facellm",
-                    "status": "error",
-                    "stderr": e.stderr
-                }
-
-            fout.write(json.dumps(record) + "\n")
-            fout.flush()  # CRUCIAL on FRIDA
+    worker = None
+    if args.backend == "worker":
+        # Started on the first pass, kept for the retry passes
+        worker = FaceLLMWorker(args.model_path, args.processor_path, args.max_new_tokens,
+                               args.batch_size, args.max_wait_ms, args.prefetch_threads,
+                               args.prefetch_depth, args.resize, args.offline, args.image_store)
+
+    started = time.perf_counter()
+    try:
+        with JsonlWriter(out_path, args.flush_every, args.flush_interval, args.fsync) as writer:
+            # Records follow completion order, not image order: cached results come first
+            for img_path, raw_output in hits.items():
+                writer.write({"image_path": img_path, "model": "Facellm", "raw_output": raw_output, "status": "ok"})
+
+            failures = write_responses(writer, iter_responses(images, prompt, args, worker), len(images),
+                                       args, cache, keys)
+
+            # Transient failures (Hub / server errors, lost worker) get more passes, with backoff
+            for retry in range(args.retry_rounds):
+                images = [img_path for img_path, category in failures.items()
+                          if category in args.retry_categories]
+                if not images:
+                    break
+                delay = args.retry_backoff * 2 ** retry
+                print(f"[INFO] Retry {retry + 1}/{args.retry_rounds} of {len(images)} failures in {delay:.0f}s")
+                time.sleep(delay)
+                retried = set(images)
+                failures = {img_path: category for img_path, category in failures.items()
+                            if img_path not in retried}
+                failures.update(write_responses(writer, iter_responses(images, prompt, args, worker),
+                                                len(images), args, cache, keys))
+    finally:
+        if worker is not None:
+            worker.close()
+
+    if args.timings:
+        write_run_timings(out_path, {"wall": time.perf_counter() - started, "write": writer.write_seconds,
+                                     "records": writer.written, "backend": args.backend})
+
+    if cache is not None:
+        print(cache.summary())
 
+    if failures:
+        print(f"[INFO] Failures left: {summary(failures.values())} (see --replay)")
     print("[INFO] Facellm inference completed.")
 
 
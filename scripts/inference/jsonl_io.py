@@ -0,0 +1,178 @@
+import json
+import os
+import signal
+import time
+
+# Records are written with json.dumps(), so "image_path" is always the first key
+# and "status" the last one. The fast path relies on that layout and only falls
+# back to a full json.loads() for lines that do not match it.
+RECORD_PREFIX = '{"image_path": '
+OK_SUFFIX = '"status": "ok"}'
+
+_decoder = json.JSONDecoder()
+
+
+def record_key(line):
+    # (image_path, is_ok) of a JSONL record, or None for an unreadable line
+    if line.startswith(RECORD_PREFIX):
+        try:
+            img_path, _ = _decoder.raw_decode(line, len(RECORD_PREFIX))
+        except ValueError:
+            return None  # truncated line from an interrupted job
+        return img_path, line.rstrip().endswith(OK_SUFFIX)
+
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if "image_path" not in record:
+        return None
+    return record["image_path"], record.get("status") == "ok"
+
+
+def completed_images(path):
+    # Set of image paths already marked status "ok" in an output JSONL
+    done = set()
+    if not os.path.exists(path):
+        return done
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            key = record_key(line)
+            if key is not None and key[1]:
+                done.add(key[0])
+
+    return done
+
+
+def with_timings(record, timings):
+    # Adds per-stage timings (seconds) to a record, before "status" so the
+    # layout above still holds
+    items = list(record.items())
+    at = next((i for i, (k, _) in enumerate(items) if k == "status"), len(items))
+    items.insert(at, ("timings", timings))
+    return dict(items)
+
+
+def write_run_timings(out_path, timings):
+    # Run-level timings (output writes, wall time, ...) next to the output
+    with open(f"{out_path}.timings.json", "w") as f:
+        json.dump(timings, f, indent=2)
+
+
+def repair_truncated_tail(path):
+    # A job killed mid-write can leave a partial last line: cut the file back
+    # to the last complete record. Returns the number of bytes discarded.
+    if not os.path.exists(path):
+        return 0
+
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return 0
+
+        # Walk back in blocks until the previous newline
+        end = size
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            block = f.read(end - start)
+            idx = block.rfind(b"\n")
+            if idx != -1:
+                keep = start + idx + 1
+                break
+            end = start
+        else:
+            keep = 0
+
+        f.truncate(keep)
+        return size - keep
+
+
+class JsonlWriter:
+    # Append-only JSONL writer that batches records in memory and flushes them
+    # every `flush_every` records or `flush_interval` seconds, whichever comes
+    # first (optionally with an fsync). On SIGTERM (SLURM time limit) or any
+    # abnormal exit, pending records are flushed and a <out>.checkpoint marker
+    # is written next to the output.
+
+    def __init__(self, path, flush_every=64, flush_interval=10.0, fsync=False, default=None):
+        self.path = str(path)
+        self.checkpoint_path = self.path + ".checkpoint"
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.default = default
+        self.buffer = []
+        self.written = 0
+        self.write_seconds = 0.0
+        self.last_flush = time.monotonic()
+        self.f = None
+        self.previous_handler = None
+        self.signalled = None
+
+    def open(self):
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r") as f:
+                print(f"[INFO] Previous run was interrupted: {f.read().strip()}")
+            os.remove(self.checkpoint_path)
+
+        discarded = repair_truncated_tail(self.path)
+        if discarded:
+            print(f"[INFO] Discarded truncated last line ({discarded} bytes) in {self.path}")
+
+        self.f = open(self.path, "a", encoding="utf-8")
+        self.previous_handler = signal.signal(signal.SIGTERM, self._on_sigterm)
+        return self
+
+    def write(self, record):
+        t0 = time.perf_counter()
+        self.buffer.append(json.dumps(record, default=self.default) + "\n")
+        if (len(self.buffer) >= self.flush_every
+                or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+        self.write_seconds += time.perf_counter() - t0
+
+    def flush(self):
+        if self.buffer:
+            # Taken off the buffer before the write: a SIGTERM exit in between
+            # must not make close() write the same records again
+            buf, self.buffer = self.buffer, []
+            self.f.write("".join(buf))
+            self.written += len(buf)
+        self.f.flush()
+        if self.fsync:
+            os.fsync(self.f.fileno())
+        self.last_flush = time.monotonic()
+
+    def write_checkpoint(self, reason):
+        with open(self.checkpoint_path, "w") as f:
+            json.dump({"reason": reason, "records_written": self.written, "time": time.time()}, f)
+            f.write("\n")
+
+    def close(self, reason=None):
+        if self.f is None:
+            return
+        self.flush()
+        if reason is not None:
+            self.write_checkpoint(reason)
+        self.f.close()
+        self.f = None
+        signal.signal(signal.SIGTERM, self.previous_handler or signal.SIG_DFL)
+
+    def _on_sigterm(self, signum, frame):
+        # Unwind through the caller's finally blocks (worker shutdown, etc.)
+        self.signalled = signal.Signals(signum).name
+        raise SystemExit(128 + signum)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        reason = self.signalled
+        if reason is None and exc_type is not None:
+            reason = exc_type.__name__
+        self.close(reason)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+# Dataset manifest: the sorted images under a directory with their size, mtime
+# and (optionally) content hash, saved to a compact text file so that every
+# stage loads it instead of walking the dataset mount again.
+# Directories are streamed with os.scandir and only image extensions are kept
+# (hidden files such as ._1.jpg are skipped). A refresh only lists the
+# directories whose mtime changed (images added, removed or renamed) and only
+# re-hashes images whose size or mtime changed; --full also re-stats the images
+# of unchanged directories (files rewritten in place).
+#
+# Layout: one JSON header line, then tab-separated lines, paths relative to
+# the dataset root:
+#   d <dir> <mtime_ns>
+#   f <image> <size> <mtime_ns> <blake2b hash or ->
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from result_cache import file_digest
+
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".bmp", ".webp"]
+VERSION = 1
+
+
+class Manifest:
+
+    def __init__(self, root, extensions=IMAGE_EXTENSIONS, hashed=False):
+        self.root = os.path.abspath(root)
+        self.extensions = [e.lower() for e in extensions]
+        self.hashed = hashed
+        self.dirs = {}   # dir -> mtime_ns
+        self.files = {}  # image -> (size, mtime_ns, hash), sorted by path
+
+    def images(self, data_dir=None):
+        # Sorted image paths, joined to data_dir as given on the command line
+        # (same strings, hence same order and shards, as a directory walk)
+        prefix = os.path.join(self.root if data_dir is None else data_dir, "")
+        return [prefix + rel for rel in self.files]
+
+    def save(self, path):
+        header = {"version": VERSION, "root": self.root, "extensions": self.extensions,
+                  "hashed": self.hashed, "images": len(self.files), "created": time.time()}
+        lines = [json.dumps(header)]
+        lines += [f"d\t{rel}\t{mtime}" for rel, mtime in sorted(self.dirs.items())]
+        lines += [f"f\t{rel}\t{size}\t{mtime}\t{digest or '-'}"
+                  for rel, (size, mtime, digest) in self.files.items()]
+
+        # Written aside then renamed: concurrent jobs never read a partial manifest
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            header = read_header(f, path)
+            manifest = cls(header["root"], header["extensions"], header["hashed"])
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if fields[0] == "f":
+                    manifest.files[fields[1]] = (int(fields[2]), int(fields[3]),
+                                                 None if fields[4] == "-" else fields[4])
+                elif fields[0] == "d":
+                    manifest.dirs[fields[1]] = int(fields[2])
+        return manifest
+
+
+def read_header(f, path, data_dir=None):
+    header = json.loads(f.readline())
+    if header.get("version") != VERSION:
+        raise ValueError(f"{path}: unsupported manifest version {header.get('version')}")
+    if data_dir is not None and header["root"] != os.path.abspath(data_dir):
+        raise SystemExit(f"{path} lists {header['root']}, not {os.path.abspath(data_dir)}")
+    return header
+
+
+def read_images(path, data_dir):
+    # Image paths only, without parsing sizes / mtimes / hashes
+    prefix = os.path.join(data_dir, "")
+    with open(path, "r", encoding="utf-8") as f:
+        read_header(f, path, data_dir)
+        return [prefix + line.split("\t", 2)[1] for line in f if line[0] == "f"]
+
+
+def scan(root, previous=None, extensions=IMAGE_EXTENSIONS, hashed=False, full=False, threads=8):
+    # New manifest of root, reusing what is still valid in `previous`.
+    # Returns (manifest, stats).
+    manifest = Manifest(root, extensions, hashed)
+    extensions = tuple(manifest.extensions)
+    stats = {"dirs_listed": 0, "dirs_reused": 0, "added": 0, "changed": 0, "removed": 0, "hashed": 0}
+
+    old_files, old_dirs = {}, {}
+    if previous is not None:
+        # Previous entries grouped by parent directory
+        for rel, entry in previous.files.items():
+            old_files.setdefault(os.path.dirname(rel), {})[rel] = entry
+        for rel in previous.dirs:
+            if rel:
+                old_dirs.setdefault(os.path.dirname(rel), []).append(rel)
+
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        path = os.path.join(manifest.root, rel_dir)
+        mtime = os.stat(path).st_mtime_ns
+        manifest.dirs[rel_dir] = mtime
+        known = old_files.get(rel_dir, {})
+
+        if previous is not None and previous.dirs.get(rel_dir) == mtime and not full:
+            # Same listing as last time: no readdir, no stat of its images
+            stats["dirs_reused"] += 1
+            manifest.files.update(known)
+            stack.extend(old_dirs.get(rel_dir, []))
+            continue
+
+        stats["dirs_listed"] += 1
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                rel = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                if entry.is_dir():
+                    stack.append(rel)
+                elif entry.name.lower().endswith(extensions) and entry.is_file():
+                    st = entry.stat()
+                    old = known.pop(rel, None)
+                    if old is not None and old[:2] == (st.st_size, st.st_mtime_ns):
+                        manifest.files[rel] = old
+                    else:
+                        stats["added" if old is None else "changed"] += 1
+                        manifest.files[rel] = (st.st_size, st.st_mtime_ns, None)
+        stats["removed"] += len(known)
+
+    if previous is not None:
+        # Directories that disappeared with everything under them
+        stats["removed"] += sum(len(files) for rel_dir, files in old_files.items()
+                                if rel_dir not in manifest.dirs)
+
+    manifest.files = dict(sorted(manifest.files.items()))
+
+    if hashed:
+        todo = [rel for rel, (_, _, digest) in manifest.files.items() if digest is None]
+        paths = [os.path.join(manifest.root, rel) for rel in todo]
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for rel, digest in zip(todo, pool.map(file_digest, paths)):
+                size, mtime, _ = manifest.files[rel]
+                manifest.files[rel] = (size, mtime, digest)
+        stats["hashed"] = len(todo)
+
+    return manifest, stats
+
+
+def build_manifest(data_dir, path, hashed=False, full=False, extensions=IMAGE_EXTENSIONS, threads=8):
+    # Creates or refreshes the manifest at `path`
+    previous = Manifest.load(path) if os.path.exists(path) else None
+    if previous is not None:
+        if previous.root != os.path.abspath(data_dir):
+            raise SystemExit(f"{path} lists {previous.root}, not {os.path.abspath(data_dir)}")
+        hashed = hashed or previous.hashed
+        if previous.extensions != [e.lower() for e in extensions]:
+            full = True  # other filter: every directory is listed again
+    manifest, stats = scan(data_dir, previous, extensions, hashed, full, threads)
+    manifest.save(path)
+    return manifest, stats
+
+
+def find_images(data_dir, extensions=IMAGE_EXTENSIONS):
+    # Sorted image paths under data_dir, without stat() calls
+    extensions = tuple(e.lower() for e in extensions)
+    images, stack = [], [data_dir]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(extensions):
+                    images.append(entry.path)
+    return sorted(images)
+
+
+def list_images(data_dir, manifest_path=None):
+    # Sorted image paths under data_dir. With a manifest, they are read from it
+    # (built on first use; refresh it with manifest.py when the dataset changes)
+    if manifest_path is None:
+        return find_images(data_dir)
+
+    if os.path.exists(manifest_path):
+        images = read_images(manifest_path, data_dir)
+        print(f"[INFO] Images listed from {manifest_path}")
+        return images
+
+    manifest, _ = build_manifest(data_dir, manifest_path)
+    print(f"[INFO] Manifest written to {manifest_path}")
+    return manifest.images(data_dir)
+
+
+def read_image_list(path):
+    # One image path per line, kept in file order (e.g. a sampling schedule)
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Build or refresh a dataset manifest")
+
+    parser.add_argument("--data", type=str, required=True,
+                        help="Image directory")
+    parser.add_argument("--out", type=str, required=True,
+                        help="Manifest file (refreshed incrementally when it exists)")
+    parser.add_argument("--hash", action="store_true",
+                        help="Also record a content hash of every image")
+    parser.add_argument("--full", action="store_true",
+                        help="List every directory again, even those whose mtime did not change")
+    parser.add_argument("--extensions", type=str, nargs="+", default=IMAGE_EXTENSIONS,
+                        help="Image extensions kept")
+    parser.add_argument("--threads", type=int, default=8,
+                        help="Threads hashing images")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    t0 = time.perf_counter()
+    manifest, stats = build_manifest(args.data, args.out, args.hash, args.full, args.extensions, args.threads)
+    print(f"[INFO] {len(manifest.files)} images in {len(manifest.dirs)} directories "
+          f"({time.perf_counter() - t0:.2f}s)")
+    print(f"[INFO] Directories listed: {stats['dirs_listed']}, unchanged: {stats['dirs_reused']}; "
+          f"images added: {stats['added']}, changed: {stats['changed']}, removed: {stats['removed']}, "
+          f"hashed: {stats['hashed']}")
+    print(f"[INFO] Manifest saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
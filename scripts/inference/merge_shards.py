@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import argparse
+from pathlib import Path
+from tqdm import tqdm
+
+from jsonl_io import record_key
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Merge sharded inference outputs")
+
+    parser.add_argument("--shards", type=str, nargs="+", required=True,
+                        help="Shard JSONL files (e.g. results/raw/deepface_full.shard*.jsonl)")
+    parser.add_argument("--out", type=str, required=True,
+                        help="Merged JSONL file")
+
+    return parser.parse_args()
+
+
+def index_shards(files):
+    # First pass: keep only (shard, byte offset) of the best record per image.
+    # An ok record always beats an error; otherwise the most recent one wins.
+    index = {}
+
+    for shard_id, f in enumerate(files):
+        offset = 0
+        for line in f:
+            key = record_key(line.decode("utf-8"))
+            if key is not None:
+                img_path, ok = key
+                previous = index.get(img_path)
+                if previous is None or ok or not previous[2]:
+                    index[img_path] = (shard_id, offset, ok)
+            offset += len(line)
+
+    return index
+
+
+def main():
+    args = parse_args()
+
+    files = [open(p, "rb") for p in args.shards]
+    try:
+        index = index_shards(files)
+
+        n_errors = sum(1 for _, _, ok in index.values() if not ok)
+        print(f"[INFO] Unique images: {len(index)} (errors: {n_errors})")
+
+        out_path = Path(args.out)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Second pass: stream records back in image order, one line at a time
+        with open(out_path, "wb") as fout:
+            for img_path in tqdm(sorted(index)):
+                shard_id, offset, _ = index[img_path]
+                f = files[shard_id]
+                f.seek(offset)
+                line = f.readline()
+                fout.write(line if line.endswith(b"\n") else line + b"\n")
+    finally:
+        for f in files:
+            f.close()
+
+    print("[INFO] Merge completed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def load_image(img_path, size=None):
+    # Decoded RGB uint8 array, optionally resized to (size, size)
+    from PIL import Image
+
+    with Image.open(img_path) as img:
+        img = img.convert("RGB")
+        if size is not None and img.size != (size, size):
+            img = img.resize((size, size), Image.BILINEAR)
+        return np.asarray(img)
+
+
+class Prefetcher:
+    # Decodes images in a thread pool, at most `depth` ahead of the consumer.
+    # Iterating yields (img_path, array, error) in input order; wait_seconds is
+    # the time the consumer spent blocked on input.
+
+    def __init__(self, img_paths, num_threads=4, depth=16, size=None, load_fn=load_image):
+        self.img_paths = img_paths
+        self.num_threads = num_threads
+        self.depth = depth
+        self.size = size
+        self.load_fn = load_fn
+        self.wait_seconds = 0.0
+        self.count = 0
+        self.started = None
+
+    def __iter__(self):
+        self.started = time.perf_counter()
+        img_paths = iter(self.img_paths)
+        in_flight = deque()
+
+        with ThreadPoolExecutor(max_workers=self.num_threads) as pool:
+            for img_path in img_paths:
+                in_flight.append((img_path, pool.submit(self.load_fn, img_path, self.size)))
+                if len(in_flight) >= self.depth:
+                    yield self._next(in_flight)
+            while in_flight:
+                yield self._next(in_flight)
+
+    def _next(self, in_flight):
+        img_path, future = in_flight.popleft()
+        t0 = time.perf_counter()
+        try:
+            array, error = future.result(), None
+        except Exception as e:
+            array, error = None, e
+        self.wait_seconds += time.perf_counter() - t0
+        self.count += 1
+        return img_path, array, error
+
+    def summary(self):
+        total = time.perf_counter() - self.started if self.started else 0.0
+        share = 100 * self.wait_seconds / total if total else 0.0
+        return (f"[INFO] Input wait: {self.wait_seconds:.1f}s over {self.count} images "
+                f"({share:.1f}% of {total:.1f}s)")
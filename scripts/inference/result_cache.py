@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Content-addressed cache of per-image inference results.
+# An entry key hashes the image bytes together with the model identifier, the
+# model version and the prompt, so a re-run only pays for images whose content,
+# model or prompt changed. Entries are small JSON files under
+# <root>/<2 hex chars>/<key>.json. Hits refresh the file mtime, and the least
+# recently used entries are evicted once the cache grows past max_bytes.
+
+HASH_CHUNK = 1 << 20
+
+
+def file_digest(path):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def text_digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=20).hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, root, max_bytes, model_id, model_version="", prompt="", default=None):
+        self.root = str(root)
+        self.max_bytes = max_bytes
+        self.default = default
+        self.hits = 0
+        self.stores = 0
+        self.evicted = 0
+        # Everything but the image content is folded into one namespace digest
+        self.namespace = text_digest(json.dumps([model_id, model_version, text_digest(prompt)]))
+        os.makedirs(self.root, exist_ok=True)
+        self.size = self._scan_size()
+
+    def _entries(self):
+        for shard in os.scandir(self.root):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith(".json"):
+                        yield entry
+
+    def _scan_size(self):
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".json")
+
+    def key(self, img_path):
+        try:
+            return text_digest(self.namespace + file_digest(img_path))
+        except OSError:
+            return None  # unreadable image: never cached, the model reports the error
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)  # LRU order
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(value, default=self.default)
+        # Atomic so that concurrent jobs sharing the cache never read half an entry
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        try:
+            replaced = os.path.getsize(path)  # overwritten entry no longer counts
+        except OSError:
+            replaced = 0
+        os.replace(tmp, path)
+        self.size += os.path.getsize(path) - replaced
+        self.stores += 1
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self, target=0.9):
+        # Drop least recently used entries until the cache is below target * max_bytes
+        entries = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in self._entries()))
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.size <= target * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+            self.evicted += 1
+
+    def lookup(self, img_paths, threads=8):
+        # Hashes every image (in threads, hashlib releases the GIL) and returns
+        # ({img_path: key}, {img_path: cached value}) for the hits
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            keys = dict(zip(img_paths, pool.map(self.key, img_paths)))
+        hits = {}
+        for img_path, key in keys.items():
+            value = None if key is None else self.get(key)
+            if value is not None:
+                hits[img_path] = value
+        return keys, hits
+
+    def summary(self):
+        return (f"[INFO] Cache: {self.hits} hits, {self.stores} stored, {self.evicted} evicted, "
+                f"{self.size / 1e6:.1f} MB in {self.root}")
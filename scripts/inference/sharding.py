@@ -0,0 +1,16 @@
+from pathlib import Path
+
+
+def shard_images(images, shard_index, num_shards):
+    # Round-robin over the sorted list: stable for a given dataset and
+    # balanced even when neighbouring images have similar cost
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+    return images[shard_index::num_shards]
+
+
+def shard_output_path(out_path, shard_index, num_shards):
+    out_path = Path(out_path)
+    if num_shards == 1:
+        return out_path
+    return out_path.with_name(f"{out_path.stem}.shard{shard_index:03d}-of-{num_shards:03d}{out_path.suffix}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+# Deterministic CPU stand-ins for DeepFace and FaceLLM, used by benchmark.py to
+# measure the inference wrappers without a GPU or model weights.
+# Loading sleeps for load_s; every image then costs latency_ms of busy CPU time
+# (+/- jitter, derived from the image bytes so that runs are repeatable), and
+# the answer has the same shape as the real model's output.
+# Run as a script, it mimics the FaceLLM inference.py command line.
+
+import argparse
+import hashlib
+import json
+import time
+
+# Kept import-free (no common.taxonomy / pandas): in subprocess mode every image
+# pays the stub's start-up, which should only stand for the real script's.
+AGE_BINS = ["0-2", "3-9", "10-19", "20-29", "30-39", "40-49", "50-59", "60-69", "70+"]
+GENDER_LABELS = ["Female", "Male"]
+RACE_LABELS = ["Asian", "Black", "Indian", "Latino_Hispanic", "Middle Eastern", "White"]
+DEEPFACE_GENDER_KEYS = ["Woman", "Man"]
+DEEPFACE_RACE_KEYS = ["asian", "black", "indian", "latino hispanic", "middle eastern", "white"]
+
+
+def unit_values(data, n):
+    # n deterministic floats in [0, 1) from some bytes
+    digest = hashlib.blake2b(data, digest_size=2 * n).digest()
+    return [int.from_bytes(digest[2 * i:2 * i + 2], "little") / 65536 for i in range(n)]
+
+
+def image_bytes(img):
+    if isinstance(img, str):
+        with open(img, "rb") as f:
+            return f.read()
+    return img.tobytes()
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class StubDeepFace:
+    # Same load() / analyze() interface as infer_deepface.DeepFaceBackend
+
+    def __init__(self, load_s=1.0, latency_ms=50, jitter=0.25):
+        self.load_s = load_s
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+
+    def load(self, threads=None):
+        time.sleep(self.load_s)
+
+    def analyze_batch(self, imgs):
+        # Same interface as infer_deepface.DeepFaceBatchBackend, same cost per image
+        return [self.analyze(img) for img in imgs]
+
+    def analyze(self, img):
+        u = unit_values(image_bytes(img), 4)
+        busy_wait(self.latency_ms / 1000 * (1 + self.jitter * (2 * u[0] - 1)))
+
+        gender = DEEPFACE_GENDER_KEYS[int(u[1] * len(DEEPFACE_GENDER_KEYS))]
+        race = DEEPFACE_RACE_KEYS[int(u[2] * len(DEEPFACE_RACE_KEYS))]
+        return [{
+            "age": int(5 + u[3] * 70),
+            "region": {"x": 0, "y": 0, "w": 223, "h": 223, "left_eye": None, "right_eye": None},
+            "face_confidence": round(u[3], 2),
+            "gender": {k: 90.0 if k == gender else 10.0 for k in DEEPFACE_GENDER_KEYS},
+            "dominant_gender": gender,
+            "race": {k: 50.0 if k == race else 10.0 for k in DEEPFACE_RACE_KEYS},
+            "dominant_race": race,
+        }]
+
+
+def facellm_answer(data):
+    u = unit_values(data, 4)
+    return json.dumps({
+        "gender": GENDER_LABELS[int(u[0] * len(GENDER_LABELS))],
+        "ethnicity": RACE_LABELS[int(u[1] * len(RACE_LABELS))],
+        "age_range": AGE_BINS[int(u[2] * len(AGE_BINS))],
+        "confidence": {"gender": 0.9, "ethnicity": round(u[3], 2), "age": 0.5},
+    })
+
+
+class StubFaceLLM:
+    # Same load() / generate() interface as facellm_worker.FaceLLMModel
+
+    def __init__(self, load_s=1.0, latency_ms=50, jitter=0.25):
+        self.load_s = load_s
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+
+    def load(self):
+        time.sleep(self.load_s)
+
+    def generate(self, images, prompt):
+        outputs = []
+        for img in images:
+            data = image_bytes(img)
+            u = unit_values(data, 1)[0]
+            busy_wait(self.latency_ms / 1000 * (1 + self.jitter * (2 * u - 1)))
+            outputs.append(facellm_answer(data))
+        return outputs
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Stub FaceLLM inference.py")
+
+    parser.add_argument("--path_image", type=str, required=True)
+    parser.add_argument("--prompt", type=str, required=True)
+    parser.add_argument("--load_s", type=float, default=1.0)
+    parser.add_argument("--latency_ms", type=float, default=50)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    model = StubFaceLLM(args.load_s, args.latency_ms)
+    model.load()
+    print(model.generate([args.path_image], args.prompt)[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+# Minimal OpenAI-compatible server answering with the FaceLLM stub, to test
+# and benchmark the client mode of infer_facellm.py without a GPU.
+# Requests overlap like on a continuously batching server: up to
+# --max_concurrency are "generated" at the same time, each taking
+# --latency_ms. --fail_every N answers every Nth request with a 503 to
+# exercise retries.
+
+import argparse
+import asyncio
+import base64
+import json
+import time
+
+from stub_backends import facellm_answer
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 503: "Service Unavailable"}
+
+
+class StubServer:
+
+    def __init__(self, latency_ms=50, max_concurrency=64, fail_every=0):
+        self.latency = latency_ms / 1000
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.fail_every = fail_every
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        # One keep-alive connection: serve requests until the client closes it
+        try:
+            while (request_line := await reader.readline()):
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self.respond(method, path, body)
+                data = json.dumps(payload).encode("utf-8")
+                writer.write((f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                              f"Content-Length: {len(data)}\r\n\r\n").encode("latin-1") + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, path, body):
+        if method == "GET" and path.endswith("/models"):
+            return 200, {"object": "list", "data": [{"id": "stub", "object": "model"}]}
+        if method != "POST" or not path.endswith("/chat/completions"):
+            return 404, {"error": {"message": f"No route for {method} {path}"}}
+
+        self.requests += 1
+        if self.fail_every and self.requests % self.fail_every == 0:
+            return 503, {"error": {"message": "Simulated overload"}}
+
+        try:
+            content = json.loads(body)["messages"][0]["content"]
+            url = next(part["image_url"]["url"] for part in content if part["type"] == "image_url")
+            image = base64.b64decode(url.split(",", 1)[1])
+        except (ValueError, KeyError, IndexError, StopIteration) as e:
+            return 400, {"error": {"message": f"Bad request: {e}"}}
+
+        async with self.slots:
+            await asyncio.sleep(self.latency)
+
+        return 200, {
+            "id": f"stub-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": facellm_answer(image)}}],
+        }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Stub OpenAI-compatible FaceLLM server")
+
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency_ms", type=float, default=50,
+                        help="Simulated generation time per request")
+    parser.add_argument("--max_concurrency", type=int, default=64,
+                        help="Requests generated at the same time (batch slots)")
+    parser.add_argument("--fail_every", type=int, default=0,
+                        help="Answer every Nth request with a 503 (0: never)")
+
+    return parser.parse_args()
+
+
+async def serve(args):
+    stub = StubServer(args.latency_ms, args.max_concurrency, args.fail_every)
+    server = await asyncio.start_server(stub.handle, args.host, args.port)
+    print(f"[INFO] Stub server listening on http://{args.host}:{args.port}/v1", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    asyncio.run(serve(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# Stage breakdown of inference runs made with --timings.
+# Per-image stages come from the "timings" of every record, one-off stages
+# (worker start, model load) are listed apart, and output writes / wall time
+# come from the <out>.timings.json file written next to each output.
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from jsonl_io import record_key
+
+# Paid once per process, not per image
+STARTUP_STAGES = {"worker_start", "model_load"}
+# End-to-end time of a request, which overlaps the other stages
+TOTAL_STAGES = {"round_trip"}
+NOT_STAGES = {"batch_size", "attempts"}
+# One model call for the whole batch (FaceLLM worker, DeepFace --skip_detection)
+BATCH_STAGES = {"generate", "analyze"}
+
+
+def per_image_seconds(timings):
+    # Cost of one image: round trip when known, else the sum of its stages.
+    # A batched model call is shared by the images of its batch.
+    if "round_trip" in timings:
+        return timings["round_trip"]
+    return sum(amortized(timings).values())
+
+
+def amortized(timings):
+    stages = {k: v for k, v in timings.items()
+              if k not in STARTUP_STAGES | TOTAL_STAGES | NOT_STAGES and v is not None}
+    if timings.get("batch_size"):
+        for stage in BATCH_STAGES & stages.keys():
+            stages[stage] /= timings["batch_size"]
+    return stages
+
+
+def read_timings(paths):
+    rows = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if '"timings"' not in line or record_key(line) is None:
+                    continue
+                record = json.loads(line)
+                rows.append((record["image_path"], record["status"], record["timings"]))
+    return rows
+
+
+def stage_table(rows):
+    values = {}
+    for _, _, timings in rows:
+        for stage, seconds in amortized(timings).items():
+            values.setdefault(stage, []).append(seconds)
+        for stage in TOTAL_STAGES & timings.keys():
+            values.setdefault(stage, []).append(timings[stage])
+
+    leaf_total = sum(sum(v) for stage, v in values.items() if stage not in TOTAL_STAGES)
+    table = {}
+    for stage, seconds in sorted(values.items(), key=lambda kv: -sum(kv[1])):
+        seconds = np.asarray(seconds)
+        table[stage] = {
+            "n": len(seconds),
+            "total_s": float(seconds.sum()),
+            "mean_ms": float(seconds.mean() * 1000),
+            "p50_ms": float(np.percentile(seconds, 50) * 1000),
+            "p95_ms": float(np.percentile(seconds, 95) * 1000),
+            "max_ms": float(seconds.max() * 1000),
+            "share": None if stage in TOTAL_STAGES or not leaf_total else float(seconds.sum() / leaf_total),
+        }
+    return table
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Per-stage timing report of inference outputs")
+
+    parser.add_argument("inputs", type=str, nargs="+",
+                        help="JSONL outputs written with --timings (e.g. every shard)")
+    parser.add_argument("--top", type=int, default=20,
+                        help="Number of slowest images listed")
+    parser.add_argument("--out", type=str, default=None,
+                        help="Also write the report as JSON")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    rows = read_timings(args.inputs)
+    if not rows:
+        raise SystemExit("No records with timings: run inference with --timings")
+
+    table = stage_table(rows)
+    startup = [{"image_path": img_path, **{k: v for k, v in timings.items() if k in STARTUP_STAGES}}
+               for img_path, _, timings in rows if STARTUP_STAGES & timings.keys()]
+    slowest = sorted(rows, key=lambda row: -per_image_seconds(row[2]))[:args.top]
+
+    runs = {}
+    for path in args.inputs:
+        if os.path.exists(f"{path}.timings.json"):
+            with open(f"{path}.timings.json") as f:
+                runs[path] = json.load(f)
+
+    print(f"[INFO] {len(rows)} records with timings")
+    print(f"{'stage':<14}{'n':>8}{'total s':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'share':>8}")
+    for stage, s in table.items():
+        share = f"{100 * s['share']:.1f}%" if s["share"] is not None else "-"
+        print(f"{stage:<14}{s['n']:>8}{s['total_s']:>10.1f}{s['mean_ms']:>10.1f}{s['p50_ms']:>10.1f}"
+              f"{s['p95_ms']:>10.1f}{s['max_ms']:>10.1f}{share:>8}")
+
+    for entry in startup:
+        stages = ", ".join(f"{k}={v:.1f}s" for k, v in entry.items() if k != "image_path" and v is not None)
+        print(f"[INFO] Startup ({os.path.basename(entry['image_path'])}): {stages}")
+
+    for path, run in runs.items():
+        print(f"[INFO] {path}: wall {run['wall']:.1f}s, output writes {run['write']:.2f}s "
+              f"({100 * run['write'] / run['wall']:.1f}%) for {run['records']} records")
+
+    print(f"[INFO] Slowest {len(slowest)} images:")
+    for img_path, status, timings in slowest:
+        stages = ", ".join(f"{k}={1000 * v:.0f}ms" for k, v in amortized(timings).items())
+        print(f"  {1000 * per_image_seconds(timings):8.0f} ms  {img_path} [{status}] {stages}")
+
+    if args.out:
+        report = {
+            "records": len(rows),
+            "stages": table,
+            "startup": startup,
+            "runs": runs,
+            "slowest": [{"image_path": p, "status": s, "seconds": per_image_seconds(t), "timings": t}
+                        for p, s, t in slowest],
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Report saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
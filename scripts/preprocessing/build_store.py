@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+# Loads GT and normalized predictions (CSV or Parquet) into the SQLite
+# prediction store. Each predictions file becomes one run, with its source
+# file and row count kept as run metadata.
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.prediction_store import PredictionStore  # noqa: E402
+from common.taxonomy import TASKS  # noqa: E402
+from evaluation.metrics import load_gt, read_table  # noqa: E402
+
+
+def read_gt(path):
+    # Same image ids and label harmonization as the evaluation, columns named as in the store
+    return load_gt(path).rename(columns={f"{task}_gt": task for task in TASKS})
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Build / update the indexed prediction store")
+
+    parser.add_argument("--store", type=str, default="results/predictions.sqlite",
+                        help="SQLite store (created if missing)")
+    parser.add_argument("--gt", type=str, default=None,
+                        help="Ground-truth labels (CSV or Parquet)")
+    parser.add_argument("--deepface", type=str, default=None,
+                        help="Normalized DeepFace predictions (CSV or Parquet)")
+    parser.add_argument("--facellm", type=str, default=None,
+                        help="Normalized FaceLLM predictions (CSV or Parquet)")
+    parser.add_argument("--run_tag", type=str, default=None,
+                        help="Run id suffix (default: timestamp); re-using a tag replaces that run")
+    parser.add_argument("--note", type=str, default=None,
+                        help="Free text stored with the runs")
+    parser.add_argument("--wal", action="store_true",
+                        help="Write-ahead logging, faster with concurrent readers; only for a store on a local disk")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.store)), exist_ok=True)
+
+    with PredictionStore(args.store, wal=args.wal) as store:
+        if args.gt:
+            gt = read_gt(args.gt)
+            store.put_ground_truth(gt)
+            print(f"[INFO] {len(gt)} GT rows from {args.gt}")
+
+        for model, path in [("DeepFace", args.deepface), ("FaceLLM", args.facellm)]:
+            if not path:
+                continue
+            pred = read_table(path)
+            run_id = f"{model.lower()}-{args.run_tag}" if args.run_tag else None
+            metadata = {"source": os.path.abspath(path), "mtime": os.path.getmtime(path), "note": args.note}
+            run_id = store.put_predictions(pred, model, run_id, metadata)
+            print(f"[INFO] {model}: {len(pred)} predictions from {path} stored as run '{run_id}'")
+
+        print(store.runs()[["run_id", "model", "n"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
 import pandas as pd
 import json
-import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.raw_outputs import image_id_from_path, parse_facellm_json  # noqa: E402
+from common.taxonomy import harmonize  # noqa: E402
 
 #Replace by outputs/raw/facellm_full.jsonl
 INPUT_FILE = "results/facellm_full.jsonl"
@@ -24,17 +29,11 @@ with open(INPUT_FILE, "r", encoding="utf-8") as f :
     if data.get("status") != "ok":
       continue
 
-    raw = raw.strip()
-
-    if raw.startswith("```"):
-        raw = raw.replace("```json", "").replace("```", "").strip()
-
-    raw_dict = json.loads(raw)
+    raw_dict = parse_facellm_json(raw)
 
     confidence = raw_dict["confidence"]
 
-    file_name = os.path.basename(image_path)
-    image_id.append(int(os.path.splitext(file_name)[0]))
+    image_id.append(image_id_from_path(image_path))
 
     age.append(raw_dict["age_range"])
     age_confidence.append(confidence["age"])
@@ -45,6 +44,10 @@ with open(INPUT_FILE, "r", encoding="utf-8") as f :
     ethnicity.append(raw_dict["ethnicity"])
     ethnicity_confidence.append(confidence["ethnicity"])
 
+# Map free-form answers to the evaluation taxonomy ("unknown" when unmappable)
+age = harmonize(age, "age")
+gender = harmonize(gender, "gender")
+ethnicity = harmonize(ethnicity, "race")
 
 df_facellm = pd.DataFrame ({
   "image_id": image_id,
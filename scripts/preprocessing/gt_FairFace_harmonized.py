@@ -1,23 +1,50 @@
-import pandas as pd
+#!/usr/bin/env python3
 
-gt = pd.read_csv("train_labels.csv")
-df_deepface = pd.read_csv("deepface_3k.csv")
-df_facellm = pd.read_csv("facellm_3k.csv")
+import argparse
 
-gt["image_id"] = (
-    gt["image_id"]
-    .str.replace("train/", "", regex=False)
-    .str.replace(".jpg", "", regex=False)
-    .astype(int)
-)
 
-# Union is required because some images (2 images) were not processed during FaceLLM inference
-ids_inferred = set(df_facellm["image_id"].astype(int))
+def parse_args():
+    parser = argparse.ArgumentParser("Restrict the FairFace ground truth to the inferred images")
 
-gt_filtered = gt[gt["image_id"].isin(ids_inferred)].copy()
-gt_filtered.to_csv("train_labels_inferred_only.csv", index=False)
+    parser.add_argument("--gt", type=str, default="train_labels.csv",
+                        help="FairFace ground-truth labels")
+    parser.add_argument("--deepface", type=str, default="deepface_3k.csv",
+                        help="Normalized DeepFace predictions")
+    parser.add_argument("--facellm", type=str, default="facellm_3k.csv",
+                        help="Normalized FaceLLM predictions")
+    parser.add_argument("--out", type=str, default="train_labels_inferred_only.csv",
+                        help="Filtered ground truth")
 
-print("GT original :", len(gt))
-print("DeepFace :", df_deepface["image_id"].nunique())
-print("FaceLLM :", df_facellm["image_id"].nunique())
-print("GT filtré :", len(gt_filtered))
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    import pandas as pd
+
+    gt = pd.read_csv(args.gt)
+    df_deepface = pd.read_csv(args.deepface)
+    df_facellm = pd.read_csv(args.facellm)
+
+    gt["image_id"] = (
+        gt["image_id"]
+        .str.replace("train/", "", regex=False)
+        .str.replace(".jpg", "", regex=False)
+        .astype(int)
+    )
+
+    # Union is required because some images (2 images) were not processed during FaceLLM inference
+    ids_inferred = set(df_facellm["image_id"].astype(int))
+
+    gt_filtered = gt[gt["image_id"].isin(ids_inferred)].copy()
+    gt_filtered.to_csv(args.out, index=False)
+
+    print("GT original :", len(gt))
+    print("DeepFace :", df_deepface["image_id"].nunique())
+    print("FaceLLM :", df_facellm["image_id"].nunique())
+    print("GT filtré :", len(gt_filtered))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+# Streaming normalizer for raw DeepFace / FaceLLM JSONL outputs.
+# Reads the input in chunks and writes one Parquet row group per chunk, so
+# memory stays constant whatever the input size. Label columns are
+# dictionary-encoded with a fixed category list, confidences are float32 in
+# [0, 1] for both models (DeepFace percentages are divided by 100), and the
+# full DeepFace gender / race distributions are kept as float32 vectors.
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.raw_outputs import image_id_from_path, parse_facellm_json  # noqa: E402
+from common.taxonomy import AGE_BINS, GENDER_LABELS, RACE_LABELS, UNKNOWN, encode, encode_ages  # noqa: E402
+
+# DeepFace raw keys, in the same order as GENDER_LABELS / RACE_LABELS
+DEEPFACE_GENDER_KEYS = ["Woman", "Man"]
+DEEPFACE_RACE_KEYS = ["asian", "black", "indian", "latino hispanic", "middle eastern", "white"]
+
+SCHEMA = pa.schema([
+    ("image_id", pa.int64()),
+    ("model", pa.dictionary(pa.int8(), pa.string())),
+    ("age", pa.dictionary(pa.int8(), pa.string())),
+    ("age_years", pa.int16()),
+    ("age_confidence", pa.float32()),
+    ("face_confidence", pa.float32()),
+    ("gender", pa.dictionary(pa.int8(), pa.string())),
+    ("gender_confidence", pa.float32()),
+    ("gender_probs", pa.list_(pa.float32(), len(GENDER_LABELS))),
+    ("race", pa.dictionary(pa.int8(), pa.string())),
+    ("race_confidence", pa.float32()),
+    ("race_probs", pa.list_(pa.float32(), len(RACE_LABELS))),
+], metadata={
+    "gender_probs_labels": json.dumps(GENDER_LABELS),
+    "race_probs_labels": json.dumps(RACE_LABELS),
+})
+
+
+class ChunkBuffer:
+    # Preallocated column buffers for one chunk of records. Labels are kept as
+    # raw strings and mapped to taxonomy codes once per chunk.
+
+    def __init__(self, size):
+        self.size = size
+        self.n = 0
+        self.image_id = np.zeros(size, dtype=np.int64)
+        self.age = np.empty(size, dtype=object)
+        self.age_years = np.zeros(size, dtype=np.int16)
+        self.age_confidence = np.full(size, np.nan, dtype=np.float32)
+        self.face_confidence = np.full(size, np.nan, dtype=np.float32)
+        self.gender = np.empty(size, dtype=object)
+        self.gender_confidence = np.zeros(size, dtype=np.float32)
+        self.gender_probs = np.full((size, len(GENDER_LABELS)), np.nan, dtype=np.float32)
+        self.race = np.empty(size, dtype=object)
+        self.race_confidence = np.zeros(size, dtype=np.float32)
+        self.race_probs = np.full((size, len(RACE_LABELS)), np.nan, dtype=np.float32)
+
+    def full(self):
+        return self.n == self.size
+
+    def reset(self):
+        self.__init__(self.size)
+
+
+def add_deepface(buf, record):
+    raw = record["raw_output"][0]
+    i = buf.n
+
+    buf.image_id[i] = image_id_from_path(record["image_path"])
+    buf.age_years[i] = raw["age"]
+    buf.face_confidence[i] = raw["face_confidence"]
+
+    buf.gender_probs[i] = [float(raw["gender"][k]) / 100 for k in DEEPFACE_GENDER_KEYS]
+    buf.gender[i] = raw["dominant_gender"]
+    buf.gender_confidence[i] = buf.gender_probs[i, DEEPFACE_GENDER_KEYS.index(raw["dominant_gender"])]
+
+    buf.race_probs[i] = [float(raw["race"][k]) / 100 for k in DEEPFACE_RACE_KEYS]
+    buf.race[i] = raw["dominant_race"]
+    buf.race_confidence[i] = buf.race_probs[i, DEEPFACE_RACE_KEYS.index(raw["dominant_race"])]
+
+    buf.n += 1
+
+
+def add_facellm(buf, record):
+    raw = parse_facellm_json(record.get("raw_output", ""))
+    confidence = raw["confidence"]
+    i = buf.n
+
+    buf.image_id[i] = image_id_from_path(record["image_path"])
+    buf.age[i] = raw["age_range"]
+    buf.age_confidence[i] = confidence["age"]
+    buf.gender[i] = raw["gender"]
+    buf.gender_confidence[i] = confidence["gender"]
+    buf.race[i] = raw["ethnicity"]
+    buf.race_confidence[i] = confidence["ethnicity"]
+
+    buf.n += 1
+
+
+def dictionary_column(codes, labels):
+    return pa.DictionaryArray.from_arrays(pa.array(codes, type=pa.int8()), pa.array(labels))
+
+
+def vector_column(values, width):
+    # Rows that are entirely NaN (no distribution available) become nulls
+    missing = np.isnan(values).all(axis=1)
+    if missing.all():
+        return pa.nulls(len(values), type=pa.list_(pa.float32(), width))
+
+    column = pa.FixedSizeListArray.from_arrays(pa.array(values.reshape(-1)), width)
+    if missing.any():
+        column = pa.array(
+            [None if m else v for m, v in zip(missing, column.to_pylist())],
+            type=pa.list_(pa.float32(), width)
+        )
+    return column
+
+
+def to_table(buf, model_name, has_numeric_age):
+    n = buf.n
+    age_years = buf.age_years[:n]
+
+    if has_numeric_age:
+        age_codes = encode_ages(age_years).astype(np.int8)
+        age_years_column = pa.array(age_years, type=pa.int16())
+    else:
+        age_codes = encode(buf.age[:n], "age").astype(np.int8)
+        age_years_column = pa.nulls(n, type=pa.int16())
+
+    return pa.table({
+        "image_id": pa.array(buf.image_id[:n]),
+        "model": dictionary_column(np.zeros(n, dtype=np.int8), [model_name]),
+        "age": dictionary_column(age_codes, AGE_BINS + [UNKNOWN]),
+        "age_years": age_years_column,
+        "age_confidence": pa.array(buf.age_confidence[:n], from_pandas=True),
+        "face_confidence": pa.array(buf.face_confidence[:n], from_pandas=True),
+        "gender": dictionary_column(encode(buf.gender[:n], "gender").astype(np.int8),
+                                    GENDER_LABELS + [UNKNOWN]),
+        "gender_confidence": pa.array(buf.gender_confidence[:n]),
+        "gender_probs": vector_column(buf.gender_probs[:n], len(GENDER_LABELS)),
+        "race": dictionary_column(encode(buf.race[:n], "race").astype(np.int8),
+                                  RACE_LABELS + [UNKNOWN]),
+        "race_confidence": pa.array(buf.race_confidence[:n]),
+        "race_probs": vector_column(buf.race_probs[:n], len(RACE_LABELS)),
+    }).cast(SCHEMA)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Streaming normalization of raw inference outputs")
+
+    parser.add_argument("--model", type=str, required=True, choices=["deepface", "facellm"],
+                        help="Which raw format to read")
+    parser.add_argument("--input", type=str, required=True,
+                        help="Raw JSONL file (e.g. results/raw/deepface_full.jsonl)")
+    parser.add_argument("--out", type=str, required=True,
+                        help="Output Parquet file")
+    parser.add_argument("--chunk_size", type=int, default=50000,
+                        help="Records per row group")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.model == "deepface":
+        add, model_name, has_numeric_age = add_deepface, "DeepFace", True
+    else:
+        add, model_name, has_numeric_age = add_facellm, "Facellm", False
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+
+    buf = ChunkBuffer(args.chunk_size)
+    n_ok = n_skipped = 0
+
+    with open(args.input, "r", encoding="utf-8") as f, \
+            pq.ParquetWriter(args.out, SCHEMA) as writer:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if record.get("status") != "ok":
+                    n_skipped += 1
+                    continue
+                add(buf, record)
+                n_ok += 1
+            except (ValueError, KeyError, IndexError, TypeError):
+                n_skipped += 1
+                continue
+
+            if buf.full():
+                writer.write_table(to_table(buf, model_name, has_numeric_age))
+                buf.reset()
+
+        if buf.n:
+            writer.write_table(to_table(buf, model_name, has_numeric_age))
+
+    print(f"[INFO] {model_name}: {n_ok} records written to {args.out} ({n_skipped} skipped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "inference"))
+
+import infer_deepface  # noqa: E402
+import infer_facellm  # noqa: E402
+from facellm_worker import FaceLLMWorker  # noqa: E402
+
+
+@pytest.fixture
+def images(tmp_path):
+    data = tmp_path / "img"
+    data.mkdir()
+    rng = np.random.default_rng(0)
+    for i in range(1, 6):
+        Image.fromarray(rng.integers(0, 255, (16, 16, 3), dtype=np.uint8)).save(data / f"{i}.jpg")
+    return data
+
+
+def run(module, monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", [module.__name__, *map(str, argv)])
+    module.main()
+
+
+def read_records(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def no_backend(*args, **kwargs):
+    raise AssertionError("model backend started although every image was cached")
+
+
+def test_facellm_all_cached_starts_no_worker(images, tmp_path, monkeypatch):
+    prompt = tmp_path / "prompt.txt"
+    prompt.write_text("Describe the face.")
+    args = ["--data", images, "--prompt_file", prompt, "--backend", "worker", "--cache_dir", tmp_path / "cache"]
+
+    # First run fills the cache
+    answer = {"status": "ok", "raw_output": '{"gender": "Male"}'}
+    monkeypatch.setattr(infer_facellm, "iter_responses",
+                        lambda images, *rest: ((img_path, dict(answer)) for img_path in images))
+    run(infer_facellm, monkeypatch, *args, "--out", tmp_path / "first.jsonl")
+    monkeypatch.undo()
+
+    monkeypatch.setattr(FaceLLMWorker, "start", no_backend)
+    run(infer_facellm, monkeypatch, *args, "--out", tmp_path / "second.jsonl")
+
+    records = read_records(tmp_path / "second.jsonl")
+    assert len(records) == 5
+    assert all(record["status"] == "ok" for record in records)
+
+
+def test_deepface_all_cached_loads_no_model(images, tmp_path, monkeypatch):
+    args = ["--data", images, "--cache_dir", tmp_path / "cache"]
+
+    monkeypatch.setattr(infer_deepface, "iter_records",
+                        lambda images, *rest, **kwargs: (infer_deepface.ok_record(img_path, [{"age": 30}])
+                                                         for img_path in images))
+    run(infer_deepface, monkeypatch, *args, "--out", tmp_path / "first.jsonl")
+    monkeypatch.undo()
+
+    monkeypatch.setattr(infer_deepface, "init_worker", no_backend)
+    run(infer_deepface, monkeypatch, *args, "--out", tmp_path / "second.jsonl")
+
+    records = read_records(tmp_path / "second.jsonl")
+    assert [record["image_path"] for record in records] == sorted(str(p) for p in images.glob("*.jpg"))
+    assert all(record["status"] == "ok" for record in records)